@@ -0,0 +1,29 @@
+import os
+import subprocess
+import llvmlite.binding as llvm
+import codegen
+
+# c runtime with main, getarg and getargf, linked into every executable
+RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ekrt.c')
+
+
+def target_machine():
+    ''' Host target machine producing position independent code for the linker '''
+    codegen.initialize_llvm()
+    return llvm.Target.from_default_triple().create_target_machine(reloc='pic')
+
+def emit_obj(fileName, parsed_module):
+    with open(fileName, 'wb') as f:
+        f.write(target_machine().emit_object(parsed_module))
+
+def emit_asm(fileName, parsed_module):
+    with open(fileName, 'w') as f:
+        f.write(target_machine().emit_assembly(parsed_module))
+
+def link(fileName, objFileName, cc=None):
+    '''
+    Link an object file with the runtime into an executable using the
+    system c compiler ($CC, default cc)
+    '''
+    cc = cc or os.environ.get('CC', 'cc')
+    subprocess.check_call([cc, '-O2', '-o', fileName, objFileName, RUNTIME])
@@ -0,0 +1,8 @@
+'''
+Headless benchmarks of the compiler and the code it generates
+    python -m bench run [-O 0 2 3] [--repeat 5] [--warmup 1] [--cpu 0] [-o results.json] [names]
+    python -m bench compare baseline.json results.json [--threshold 0.1]
+    python -m bench plot results.json plot.png
+    python -m bench generate [--functions 10 ...] [-o prog.ek]
+    python -m bench scale [--parameter functions] [--values 25 50 100] [-o scaling.json]
+'''
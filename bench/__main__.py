@@ -0,0 +1,135 @@
+import argparse
+import json
+import sys
+import codegen
+from bench import programs, runner, compare, plot, generate, scaling
+
+
+def print_result(result):
+    print('{:<10} -O{:<2} compile {:>10.6f}s  run {:>10.6f}s  (median of {})'.format(
+        result['benchmark'], result['level'], result['compile']['median'],
+        result['run']['median'], len(result['run']['samples'])))
+    sys.stdout.flush()
+
+def run_command(args):
+    if args.cpu is not None:
+        runner.pin_cpu(args.cpu)
+    document = runner.run(programs.select(args.names), args.levels,
+                          args.repeat, args.warmup, print_result)
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print('results saved to ' + args.output)
+    return 0
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare.compare(baseline, current, args.threshold, args.statistic)
+    print(compare.format_rows(rows))
+    return 1 if any(row[-1] for row in rows) else 0
+
+def plot_command(args):
+    with open(args.results) as f:
+        plot.plot(json.load(f), args.image)
+    return 0
+
+def generate_command(args):
+    params = {name: getattr(args, name) for name in generate.DEFAULTS}
+    source_code = generate.generate(seed=args.seed, **params)
+    if args.output is None:
+        sys.stdout.write(source_code)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(source_code)
+    return 0
+
+def print_row(parameter, row):
+    cells = ['{}={:<5} {:>8} bytes'.format(parameter, row['value'], row['bytes'])]
+    for phase in scaling.PHASES:
+        cells.append('{} {:.4f}s {:.1f}MB'.format(
+            phase, row['phases'][phase]['time'], row['phases'][phase]['memory'] / 1e6))
+    cells.append('lex {:.2f}MB/s'.format(row['lex_mb_per_s']))
+    print('  '.join(cells))
+    sys.stdout.flush()
+
+def scale_command(args):
+    parameters = args.parameters or sorted(scaling.SWEEPS)
+    results = []
+    for parameter in parameters:
+        values = args.values or scaling.SWEEPS[parameter]
+        result = scaling.sweep(parameter, values, args.repeat, args.seed, print_row)
+        for phase in scaling.PHASES:
+            exponent = result['exponents'][phase]
+            print('  {} exponent: time {}  memory {}'.format(phase, *[
+                'n/a' if exponent[k] is None else '{:.2f}'.format(exponent[k]) for k in ['time', 'memory']]))
+        results.append(result)
+    with open(args.output, 'w') as f:
+        json.dump({'meta': runner.metadata(args.repeat, 0), 'sweeps': results}, f, indent=2)
+    print('results saved to ' + args.output)
+    return 0
+
+def list_command(args):
+    for program in programs.PROGRAMS.values():
+        print('{:<10} {}'.format(program.name, program.description))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run = commands.add_parser('run', help='measure compile and run time')
+    run.add_argument('names', nargs='*', help='benchmarks to run, default all')
+    run.add_argument('-O', dest='levels', nargs='+', default=['0', '1', '2', '3'],
+                     choices=sorted(codegen.OPT_LEVELS), help='optimization levels')
+    run.add_argument('--repeat', type=int, default=5, help='timed runs per level')
+    run.add_argument('--warmup', type=int, default=1, help='untimed runs per level first')
+    run.add_argument('--cpu', type=int, default=None, help='pin the process to this cpu')
+    run.add_argument('-o', dest='output', default='bench-results.json', help='results json file')
+    run.set_defaults(func=run_command)
+
+    cmp = commands.add_parser('compare', help='flag regressions against a baseline')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.1,
+                     help='relative slowdown reported as a regression')
+    cmp.add_argument('--statistic', default='median',
+                     choices=['median', 'mean', 'min', 'p10', 'p90'])
+    cmp.set_defaults(func=compare_command)
+
+    plt = commands.add_parser('plot', help='export a plot of a results file (needs matplotlib)')
+    plt.add_argument('results')
+    plt.add_argument('image')
+    plt.set_defaults(func=plot_command)
+
+    gen = commands.add_parser('generate', help='write a synthetic EK program')
+    for name, default in generate.DEFAULTS.items():
+        gen.add_argument('--' + name, type=int, default=default)
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('-o', dest='output', default=None, help='output file, default stdout')
+    gen.set_defaults(func=generate_command)
+
+    scl = commands.add_parser('scale', help='time and peak memory of the front end on growing programs')
+    scl.add_argument('--parameter', dest='parameters', action='append',
+                     choices=sorted(scaling.SWEEPS), help='parameter to sweep, default all')
+    scl.add_argument('--values', type=int, nargs='+', default=None,
+                     help='values to sweep, default from scaling.SWEEPS')
+    scl.add_argument('--repeat', type=int, default=3, help='timed runs per program, best is kept')
+    scl.add_argument('--seed', type=int, default=0)
+    scl.add_argument('-o', dest='output', default='bench-scaling.json', help='results json file')
+    scl.set_defaults(func=scale_command)
+
+    lst = commands.add_parser('list', help='list the benchmarks')
+    lst.set_defaults(func=list_command)
+
+    args = parser.parse_args()
+    try:
+        sys.exit(args.func(args))
+    except (KeyError, RuntimeError) as err:
+        parser.exit(2, '{}\n'.format(err.args[0]))
+
+if __name__ == '__main__':
+    main()
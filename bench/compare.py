@@ -0,0 +1,33 @@
+METRICS = ['compile', 'run']
+
+
+def index(document):
+    return {(r['benchmark'], r['level']): r for r in document['results']}
+
+def compare(baseline, current, threshold=0.1, statistic='median'):
+    '''
+    Compare the statistic of every benchmark, level and metric found in both
+    results documents
+    Return rows of (benchmark, level, metric, baseline, current, change,
+    regressed), where change is current / baseline - 1 and a change above
+    threshold is a regression
+    '''
+    rows = []
+    base = index(baseline)
+    for key, result in sorted(index(current).items()):
+        if key not in base:
+            continue
+        for metric in METRICS:
+            old = base[key][metric][statistic]
+            new = result[metric][statistic]
+            change = new / old - 1 if old > 0 else 0.0
+            rows.append(key + (metric, old, new, change, change > threshold))
+    return rows
+
+def format_rows(rows):
+    lines = ['{:<10} {:>5} {:<8} {:>12} {:>12} {:>8}'.format(
+        'benchmark', 'level', 'metric', 'baseline', 'current', 'change')]
+    for benchmark, level, metric, old, new, change, regressed in rows:
+        lines.append('{:<10} {:>5} {:<8} {:>12.6f} {:>12.6f} {:>+7.1%}{}'.format(
+            benchmark, level, metric, old, new, change, '  REGRESSION' if regressed else ''))
+    return '\n'.join(lines)
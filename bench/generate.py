@@ -0,0 +1,128 @@
+import random
+
+DEFAULTS = {
+    'functions': 10,   # functions besides run
+    'statements': 5,   # simple statements per block
+    'depth': 2,        # nested if / while blocks below each function body
+    'expression': 4,   # binary operators per expression
+    'externs': 2,      # extern declarations (never called)
+    'refs': 1,         # ref int parameters per function
+}
+
+
+class Generator:
+    '''
+    Emit a valid EK program of a given shape
+    Every function takes an int and refs ref int parameters and calls the
+    function before it once, loops run twice, so the program also runs
+    quickly under -jit
+    '''
+    def __init__(self, functions, statements, depth, expression, externs, refs, seed=0):
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.expression = expression
+        self.externs = externs
+        self.refs = refs
+        self.rng = random.Random(seed)
+        self.lines = []
+        self.names = 0
+
+    def emit(self, indent, line):
+        self.lines.append('  ' * indent + line)
+
+    def new_var(self, prefix='v'):
+        self.names += 1
+        return '${}{}'.format(prefix, self.names)
+
+    def operand(self, readable):
+        if self.rng.random() < 0.3:
+            return str(self.rng.randint(0, 9))
+        return self.rng.choice(readable)
+
+    def exp(self, readable, length=None):
+        ''' int expression with length binary operators over readable vars '''
+        length = self.expression if length is None else length
+        text = self.operand(readable)
+        for _ in range(length):
+            op = self.rng.choice(['+', '-', '*'])
+            if self.rng.random() < 0.2:
+                text = '({}) {} {}'.format(text, op, self.operand(readable))
+            else:
+                text = '{} {} {}'.format(text, op, self.operand(readable))
+        return text
+
+    def call(self, index, readable, writable):
+        args = [self.exp(readable, 1)] + [self.rng.choice(writable) for _ in range(self.refs)]
+        return 'f{}({})'.format(index, ', '.join(args))
+
+    def block(self, indent, depth, readable, writable, callee=None):
+        '''
+        Statements of one block; readable and writable are the int variables
+        in scope, loop counters are readable only
+        '''
+        readable, writable = list(readable), list(writable)
+        for i in range(self.statements):
+            kind = i % 3
+            if kind == 0 or len(writable) == 0:
+                var = self.new_var()
+                self.emit(indent, 'int {} = {};'.format(var, self.exp(readable)))
+                readable.append(var)
+                writable.append(var)
+            elif kind == 1:
+                self.emit(indent, '{} = {};'.format(self.rng.choice(writable), self.exp(readable)))
+            else:
+                self.emit(indent, '{} = {} + 1;'.format(self.rng.choice(writable), self.rng.choice(readable)))
+        if callee is not None:
+            self.emit(indent, '{} = {};'.format(self.rng.choice(writable), self.call(callee, readable, writable)))
+        if depth > 0:
+            if depth % 2:
+                self.emit(indent, 'if ({} < {}) {{'.format(self.rng.choice(readable), self.exp(readable, 1)))
+                self.block(indent + 1, depth - 1, readable, writable)
+                self.emit(indent, '} else {')
+                self.emit(indent + 1, '{} = {};'.format(self.rng.choice(writable), self.exp(readable, 1)))
+                self.emit(indent, '}')
+            else:
+                counter = self.new_var('w')
+                self.emit(indent, 'int {} = 0;'.format(counter))
+                self.emit(indent, 'while ({} < 2) {{'.format(counter))
+                self.block(indent + 1, depth - 1, readable + [counter], writable)
+                self.emit(indent + 1, '{0} = {0} + 1;'.format(counter))
+                self.emit(indent, '}')
+        return readable
+
+    def function(self, index):
+        params = ['int $a'] + ['ref int $r{}'.format(k) for k in range(self.refs)]
+        self.emit(0, 'def int f{} ({}) {{'.format(index, ', '.join(params)))
+        self.names = 0
+        readable = ['$a'] + ['$r{}'.format(k) for k in range(self.refs)]
+        callee = index - 1 if index > 0 else None
+        readable = self.block(1, self.depth, readable, readable, callee)
+        self.emit(1, 'return {};'.format(self.exp(readable)))
+        self.emit(0, '}')
+
+    def program(self):
+        for k in range(self.externs):
+            self.emit(0, 'extern int ext{} (int, float);'.format(k))
+        for index in range(self.functions):
+            self.function(index)
+        self.emit(0, 'def int run () {')
+        refs = ['$s{}'.format(k) for k in range(self.refs)]
+        for ref in refs:
+            self.emit(1, 'int {} = 1;'.format(ref))
+        self.emit(1, 'int $t = 0;')
+        if self.functions > 0:
+            self.emit(1, '$t = f{}({});'.format(self.functions - 1, ', '.join(['1'] + refs)))
+        self.emit(1, 'return 0;')
+        self.emit(0, '}')
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate(seed=0, **params):
+    ''' Return the source of a program; params override DEFAULTS '''
+    shape = dict(DEFAULTS)
+    for name, value in params.items():
+        if name not in shape:
+            raise KeyError('unknown program parameter: ' + name)
+        shape[name] = value
+    return Generator(seed=seed, **shape).program()
@@ -0,0 +1,30 @@
+def plot(document, fileName):
+    '''
+    Save median compile and run time per optimization level of every
+    benchmark to an image file; needs matplotlib, which nothing else does
+    '''
+    try:
+        import matplotlib
+    except ImportError:
+        raise RuntimeError('error: plotting needs matplotlib: pip install matplotlib')
+    # no display needed, the figure only goes to a file
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    benchmarks = []
+    for result in document['results']:
+        if result['benchmark'] not in benchmarks:
+            benchmarks.append(result['benchmark'])
+
+    figure, axes = plt.subplots(1, 2, figsize=(10, 4))
+    for ax, metric in zip(axes, ['compile', 'run']):
+        for benchmark in benchmarks:
+            results = [r for r in document['results'] if r['benchmark'] == benchmark]
+            ax.plot([r['level'] for r in results], [r[metric]['median'] for r in results],
+                    marker='o', label=benchmark)
+        ax.set_xlabel('optimization level')
+        ax.set_ylabel('{} time (second)'.format(metric))
+        ax.set_title('{} time'.format(metric.capitalize()))
+        ax.legend()
+    figure.tight_layout()
+    figure.savefig(fileName)
@@ -0,0 +1,35 @@
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Program:
+    ''' A benchmark: an EK source file in the repo and its program arguments '''
+    __slots__ = ('name', 'path', 'args', 'description')
+
+    def __init__(self, name, path, args=(), description=''):
+        self.name = name
+        self.path = os.path.join(ROOT, path)
+        self.args = list(args)
+        self.description = description
+
+
+PROGRAMS = {}
+
+def register(name, path, args=(), description=''):
+    PROGRAMS[name] = Program(name, path, args, description)
+
+register('loop', 'test/loop_test.ek', description='1e9 iteration counting loop')
+register('func', 'test/func_test.ek', description='1e9 calls of a small function')
+register('fib', 'test/test1.ek', description='recursion and ref arguments')
+register('args', 'test/test2.ek', ['1.5', '2', '3'], description='getargf and float ref updates')
+register('cint', 'test/cint_test.ek', description='cint loop whose overflow checks -O elides')
+
+def select(names):
+    ''' Return the registered programs called names, all of them when empty '''
+    if not names:
+        return list(PROGRAMS.values())
+    unknown = [name for name in names if name not in PROGRAMS]
+    if unknown:
+        raise KeyError('unknown benchmark: ' + ', '.join(unknown))
+    return [PROGRAMS[name] for name in names]
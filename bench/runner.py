@@ -0,0 +1,109 @@
+import os
+import platform
+import time
+import llvmlite
+import llvmlite.binding as llvm
+import ekparser
+import utils
+import semanticsChecker
+import codegen
+import frontend
+import phases
+from ekserver import capture_stdout
+
+PERCENTILES = [10, 90]
+
+
+def pin_cpu(cpu):
+    ''' Run this process on one cpu only, so runs do not migrate between cores '''
+    if not hasattr(os, 'sched_setaffinity'):
+        raise RuntimeError('error: cpu pinning is not supported on this platform')
+    os.sched_setaffinity(0, {cpu})
+
+def compile_and_run(program, level):
+    '''
+    Compile program at an optimization level and run it, program output
+    discarded
+    Return the compile and run wall seconds and the exit status
+    '''
+    timer = phases.PhaseTimer()
+    with timer.phase('read'):
+        source_code = utils.read_file(program.path)
+    with timer.phase('parse'):
+        ast = ekparser.getAst(source_code)
+    if not ast:
+        raise RuntimeError('error: no valid ast in ' + program.path)
+    with timer.phase('check'):
+        semanticsChecker.check(ast)
+    module = frontend.lower(ast, level, timer)
+    with timer.phase('prepare'):
+        parsed_module = codegen.prepare(module, level)
+    status = codegen.run_module(parsed_module, program.args, timer=timer)
+
+    compile_time = sum(p['wall'] for p in timer.phases if p['phase'] != 'run')
+    run_time = sum(p['wall'] for p in timer.phases if p['phase'] == 'run')
+    return compile_time, run_time, status
+
+def percentile(values, q):
+    ''' q-th percentile of values, interpolating between the closest ranks '''
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def summarize(values):
+    summary = {
+        'median': percentile(values, 50),
+        'mean': sum(values) / len(values),
+        'min': min(values),
+        'max': max(values),
+        'samples': values,
+    }
+    for q in PERCENTILES:
+        summary['p{}'.format(q)] = percentile(values, q)
+    return summary
+
+def measure(program, level, repeat, warmup):
+    ''' Return the result dict of repeat timed runs after warmup untimed ones '''
+    compile_times, run_times = [], []
+    for i in range(warmup + repeat):
+        (compile_time, run_time, status), _ = capture_stdout(compile_and_run, program, level)
+        if i >= warmup:
+            compile_times.append(compile_time)
+            run_times.append(run_time)
+    return {
+        'benchmark': program.name,
+        'level': level,
+        'exit': status,
+        'compile': summarize(compile_times),
+        'run': summarize(run_times),
+    }
+
+def metadata(repeat, warmup):
+    codegen.initialize_llvm()
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'llvmlite': llvmlite.__version__,
+        'machine': platform.machine(),
+        'cpu': llvm.get_host_cpu_name(),
+        'affinity': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'repeat': repeat,
+        'warmup': warmup,
+    }
+
+def run(programs, levels, repeat=5, warmup=1, report=None):
+    '''
+    Measure every program at every level
+    report is called with each result dict as it is ready
+    Return the results document saved as json
+    '''
+    results = []
+    for program in programs:
+        for level in levels:
+            result = measure(program, level, repeat, warmup)
+            results.append(result)
+            if report is not None:
+                report(result)
+    return {'meta': metadata(repeat, warmup), 'results': results}
@@ -0,0 +1,106 @@
+import collections
+import math
+import time
+import tracemalloc
+import eklexer
+import ekparser
+import semanticsChecker
+import codegen
+from bench.generate import generate
+
+PHASES = ['lex', 'getAst', 'check', 'generate_ir']
+
+# parameter -> values swept while the others keep their defaults
+SWEEPS = {
+    'functions': [25, 50, 100, 200, 400],
+    'statements': [10, 20, 40, 80, 160],
+    'depth': [4, 8, 16, 32, 64],
+    'expression': [8, 16, 32, 64, 128],
+    'externs': [50, 100, 200, 400, 800],
+    'refs': [4, 8, 16, 32, 64],
+}
+
+
+def lex(source_code):
+    ''' Scan source_code, dropping the tokens as getAst's parser does '''
+    collections.deque(eklexer.Lexer().scan(source_code), maxlen=0)
+
+def run_phases(source_code, phase_wrapper):
+    '''
+    Run the front end and codegen on source_code, each phase through
+    phase_wrapper; getAst lexes again, lex alone is the scanner throughput
+    '''
+    phase_wrapper('lex', lex, source_code)
+    ast = phase_wrapper('getAst', ekparser.getAst, source_code)
+    if not ast:
+        raise RuntimeError('error: generated program does not parse')
+    phase_wrapper('check', semanticsChecker.check, ast)
+    phase_wrapper('generate_ir', codegen.generate_ir, ast)
+
+def measure(source_code, repeat):
+    '''
+    Return {phase: {'time': best wall seconds of repeat runs, 'memory': peak
+    bytes allocated}}; memory is taken in a separate run since tracing
+    allocations slows everything down
+    '''
+    times = {phase: [] for phase in PHASES}
+    memory = {}
+
+    def timed(phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        times[phase].append(time.perf_counter() - start)
+        return result
+
+    def traced(phase, fn, *args):
+        tracemalloc.start()
+        try:
+            result = fn(*args)
+            memory[phase] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return result
+
+    for _ in range(repeat):
+        run_phases(source_code, timed)
+    run_phases(source_code, traced)
+    return {phase: {'time': min(times[phase]), 'memory': memory[phase]} for phase in PHASES}
+
+def fit_exponent(sizes, values):
+    '''
+    Least squares slope of log(values) over log(sizes): about 1 for linear
+    growth, 2 for quadratic
+    '''
+    points = [(math.log(x), math.log(y)) for x, y in zip(sizes, values) if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+def sweep(parameter, values, repeat=3, seed=0, report=None):
+    '''
+    Generate a program for each value of parameter and measure it
+    Exponents are fitted against the source size in bytes, so they compare
+    across parameters
+    Return the sweep result dict
+    '''
+    rows = []
+    for value in values:
+        source_code = generate(seed=seed, **{parameter: value})
+        row = {'value': value, 'bytes': len(source_code), 'phases': measure(source_code, repeat)}
+        row['lex_mb_per_s'] = len(source_code) / 1e6 / row['phases']['lex']['time']
+        rows.append(row)
+        if report is not None:
+            report(parameter, row)
+    sizes = [row['bytes'] for row in rows]
+    exponents = {}
+    for phase in PHASES:
+        exponents[phase] = {
+            'time': fit_exponent(sizes, [row['phases'][phase]['time'] for row in rows]),
+            'memory': fit_exponent(sizes, [row['phases'][phase]['memory'] for row in rows]),
+        }
+    return {'parameter': parameter, 'rows': rows, 'exponents': exponents}
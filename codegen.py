@@ -1,5 +1,11 @@
 import strings
-import copy
+import ekast
+from scope import Scope
+from options import OPT_LEVELS
+from collections import namedtuple
+from phases import timed, timed_passes
+import ctypes
+import threading
 from ctypes import CFUNCTYPE, c_int, c_float
 from llvmlite import ir
 import llvmlite.binding as llvm
@@ -10,31 +16,208 @@ i1 = ir.IntType(1)
 i32 = ir.IntType(32)
 f32 = ir.FloatType()
 
+# kaleidoscope type -> ir type, and -> value kind (int, cint, float, bool)
+IR_TYPES = {'void': ir.VoidType()}
+TYPE_KINDS = {}
+for kind, t in [('int', i32), ('cint', i32), ('float', f32), ('bool', i1)]:
+    for prefix in ['', 'ref ', 'noalias ref ']:
+        IR_TYPES[prefix + kind] = t.as_pointer() if prefix else t
+        TYPE_KINDS[prefix + kind] = kind
+
+# (op, operand kind) -> emit(builder, lhs, rhs)
+fast = ["fast"]
+BINOPS = {
+    ('add', 'int'): lambda b, l, r: b.add(l, r, name="add"),
+    ('sub', 'int'): lambda b, l, r: b.sub(l, r, name='sub'),
+    ('mul', 'int'): lambda b, l, r: b.mul(l, r, name='mul'),
+    ('div', 'int'): lambda b, l, r: b.sdiv(l, r, name='div'),
+    ('add', 'float'): lambda b, l, r: b.fadd(l, r, name="add", flags=fast),
+    ('sub', 'float'): lambda b, l, r: b.fsub(l, r, name='sub', flags=fast),
+    ('mul', 'float'): lambda b, l, r: b.fmul(l, r, name='mul', flags=fast),
+    ('div', 'float'): lambda b, l, r: b.fdiv(l, r, name='div', flags=fast),
+    ('eq', 'float'): lambda b, l, r: b.fcmp_ordered('==', l, r, name="eq", flags=fast),
+    ('lt', 'float'): lambda b, l, r: b.fcmp_ordered('<', l, r, name="lt", flags=fast),
+    ('gt', 'float'): lambda b, l, r: b.fcmp_ordered('>', l, r, name="gt", flags=fast),
+}
+for kind in ['int', 'cint']:
+    BINOPS['eq', kind] = lambda b, l, r: b.icmp_signed('==', l, r, name="eq")
+    BINOPS['lt', kind] = lambda b, l, r: b.icmp_signed('<', l, r, name="lt")
+    BINOPS['gt', kind] = lambda b, l, r: b.icmp_signed('>', l, r, name="gt")
+for kind in ['int', 'cint', 'float', 'bool']:
+    BINOPS['and', kind] = lambda b, l, r: b.and_(l, r, name="and")
+    BINOPS['or', kind] = lambda b, l, r: b.or_(l, r, name="or")
+# cint arithmetic is checked even outside a cint declaration
+for op in ['add', 'sub', 'mul', 'div']:
+    BINOPS[op, 'cint'] = lambda b, l, r, op=op: check_int(l, r, b, op)
+
+# cint op -> emit(builder, lhs, rhs) of the {result, overflow} intrinsic
+OVERFLOW_OPS = {
+    'add': lambda b, l, r: b.sadd_with_overflow(l, r, name="add"),
+    'sub': lambda b, l, r: b.ssub_with_overflow(l, r, name='sub'),
+    'mul': lambda b, l, r: b.smul_with_overflow(l, r, name='mul'),
+}
+
+# (source kind, target kind) -> emit(builder, value); same ir type needs no cast
+CASTS = {
+    ('float', 'int'): lambda b, v: b.fptosi(v, i32, name='fptosi'),
+    ('float', 'cint'): lambda b, v: b.fptosi(v, i32, name='fptosi'),
+    ('int', 'float'): lambda b, v: b.sitofp(v, f32, name='fptosi'),
+    ('cint', 'float'): lambda b, v: b.sitofp(v, f32, name='fptosi'),
+    ('bool', 'int'): lambda b, v: b.zext(v, i32),
+    ('bool', 'cint'): lambda b, v: b.zext(v, i32),
+    ('bool', 'float'): lambda b, v: b.uitofp(v, f32),
+}
+
+# --passes name -> add(pass manager, inliner threshold)
+PASSES = {
+    'adce': lambda pm, t: pm.add_aggressive_dead_code_elimination_pass(),
+    'argpromotion': lambda pm, t: pm.add_arg_promotion_pass(),
+    'basicaa': lambda pm, t: pm.add_basic_alias_analysis_pass(),
+    'constmerge': lambda pm, t: pm.add_constant_merge_pass(),
+    'dce': lambda pm, t: pm.add_dead_code_elimination_pass(),
+    'deadargelim': lambda pm, t: pm.add_dead_arg_elimination_pass(),
+    'dse': lambda pm, t: pm.add_dead_store_elimination_pass(),
+    'functionattrs': lambda pm, t: pm.add_function_attrs_pass(),
+    'globaldce': lambda pm, t: pm.add_global_dce_pass(),
+    'globalopt': lambda pm, t: pm.add_global_optimizer_pass(),
+    'gvn': lambda pm, t: pm.add_gvn_pass(),
+    'inline': lambda pm, t: pm.add_function_inlining_pass(t),
+    'instcombine': lambda pm, t: pm.add_instruction_combining_pass(),
+    'ipsccp': lambda pm, t: pm.add_ipsccp_pass(),
+    'jump-threading': lambda pm, t: pm.add_jump_threading_pass(),
+    'licm': lambda pm, t: pm.add_licm_pass(),
+    'loop-deletion': lambda pm, t: pm.add_loop_deletion_pass(),
+    'loop-rotate': lambda pm, t: pm.add_loop_rotate_pass(),
+    'loop-simplify': lambda pm, t: pm.add_loop_simplification_pass(),
+    'loop-unroll': lambda pm, t: pm.add_loop_unroll_pass(),
+    'loop-unswitch': lambda pm, t: pm.add_loop_unswitch_pass(),
+    'memcpyopt': lambda pm, t: pm.add_memcpy_optimization_pass(),
+    'mergefunc': lambda pm, t: pm.add_merge_functions_pass(),
+    'reassociate': lambda pm, t: pm.add_reassociate_expressions_pass(),
+    'sccp': lambda pm, t: pm.add_sccp_pass(),
+    'simplifycfg': lambda pm, t: pm.add_cfg_simplification_pass(),
+    'sink': lambda pm, t: pm.add_sink_pass(),
+    'sroa': lambda pm, t: pm.add_sroa_pass(),
+    'tailcallelim': lambda pm, t: pm.add_tail_call_elimination_pass(),
+    'tbaa': lambda pm, t: pm.add_type_based_alias_analysis_pass(),
+}
+
+class Pipeline(namedtuple('Pipeline', ['level', 'size_level', 'inline_threshold', 'passes'])):
+    '''
+    Optimization settings: PassManagerBuilder levels, the inliner threshold
+    (None picks one from the levels) and --passes run after the levels
+    False when it would not run any pass
+    '''
+    __slots__ = ()
+
+    def __bool__(self):
+        return self.level > 0 or len(self.passes) > 0
+
+    def threshold(self):
+        # the thresholds clang derives from -O and -Os/-Oz
+        if self.inline_threshold is not None:
+            return self.inline_threshold
+        if self.size_level:
+            return 75 if self.size_level == 1 else 25
+        return 250 if self.level >= 3 else 225
+
+# tiered execution: host hook, per function slot / counter / name globals,
+# and the count of entries plus loop back edges that makes a function hot;
+# the osr slot of a function with loops, set by the host, points at its
+# entry in the optimized module that resumes a loop mid-run
+TIER_HOOK = 'ek_tier_hot'
+TIER_SLOT = 'tier.slot.'
+TIER_COUNT = 'tier.count.'
+TIER_NAME = 'tier.name.'
+TIER_OSR = 'tier.osr.'
+TIER_ENTRY = 'tier.entry.'
+TIER_THRESHOLD = 10000
+
+# module private function every failed cint check calls
+OVERFLOW_HANDLER = 'ek.cint.overflow'
+
+# program arguments getarg and getargf read: their count and one array of
+# each type, defined by the host (set_args) or by ekrt.c in executables;
+# there is one buffer per process, so a run holds arg_lock from set_args
+# until it returns
+ARG_COUNT = 'ek_argc'
+ARG_INTS = 'ek_argi'
+ARG_FLOATS = 'ek_argf'
+arg_count = c_int(0)
+arg_ints = ctypes.c_void_p()
+arg_floats = ctypes.c_void_p()
+arg_values = None
+arg_lock = threading.Lock()
+
+llvm_initialized = False
+
 
 # main function
-def generate_ir(ast, *args):
+def generate_ir(ast, tiered=False, osr=False, only=None):
     '''
     Given ast, generate llvm ir by traversing the ast
+    The module does not depend on the program arguments: getarg and getargf
+    read them at run time (set_args)
+    tiered adds the call counters and indirect calls used by tiered.execute
+    osr adds the loop entries (TIER_ENTRY) tiered code switches to
+    only, a set of function names, limits the bodies generated to those
+    functions; the others are only declared
     Return module
     '''
     module = initialize()
-    process(ast, module, *args)
+    if tiered:
+        declare_tier_hook(module)
+    process(ast, module, only=only, osr=osr)
     return module
 
-def initialize():
+def initialize_llvm():
     '''
-    Initalize llvm and module
-    Return module
+    Initalize llvm and the native target once per process
     '''
+    global llvm_initialized
+    if llvm_initialized:
+        return
     llvm.initialize()
     llvm.initialize_native_target()
     llvm.initialize_native_asmprinter()
+    llvm.add_symbol(ARG_COUNT, ctypes.addressof(arg_count))
+    llvm.add_symbol(ARG_INTS, ctypes.addressof(arg_ints))
+    llvm.add_symbol(ARG_FLOATS, ctypes.addressof(arg_floats))
+    llvm_initialized = True
+
+def arg_int(arg):
+    ''' Convert an argument like ekrt.c: truncated, clamped to int, nan is 0 '''
+    value = float(arg)
+    if value != value:
+        return 0
+    return int(min(max(value, -2147483648), 2147483647))
+
+def set_args(args):
+    '''
+    Fill the buffer getarg and getargf of jitted code read with the program
+    arguments, converted like ekrt.c does; it holds until the next call
+    The caller holds arg_lock until the code reading them returns
+    '''
+    global arg_values
+    ints = (c_int * len(args))(*[arg_int(arg) for arg in args])
+    floats = (c_float * len(args))(*[float(arg) for arg in args])
+    arg_values = ints, floats
+    arg_count.value = len(args)
+    arg_ints.value = ctypes.addressof(ints)
+    arg_floats.value = ctypes.addressof(floats)
+
+def initialize():
+    '''
+    Initalize llvm and module
+    Return module
+    '''
+    initialize_llvm()
 
     module = ir.Module(name="prog")
     module.triple = llvm.get_default_triple()
     return module
 
-def declare_print_function(module, known_funcs):
+def declare_print_function(module):
     '''
     Declare printf function
     Code adapted from https://blog.usejournal.com/writing-your-own-programming-language-and-compiler-with-python-a468970ae6df
@@ -42,49 +225,144 @@ def declare_print_function(module, known_funcs):
     voidptr_ty = ir.IntType(8).as_pointer()
     fnty = ir.FunctionType(ir.IntType(32), [voidptr_ty], var_arg=True)
     printf = ir.Function(module, fnty, name="printf")
-    known_funcs["printf"] = "slit"
-    
-def process(ast, module, *sysArgs):
-    if strings.externs in ast:
-        process_externs(ast[strings.externs], module, *sysArgs)
-    known_funcs = ast["funcList"]
-    declare_print_function(module, known_funcs)
-    process_funcs(ast[strings.funcs], module, known_funcs)
-
-def process_externs(ast, module, *sysArgs):
-    externList = ast[strings.externs]
+
+def declare_tier_hook(module):
+    '''
+    Declare the host function told about hot functions; functions generated
+    in a module that declares it are instrumented for tiered execution
+    '''
+    fnty = ir.FunctionType(ir.VoidType(), [ir.IntType(8).as_pointer()])
+    ir.Function(module, fnty, name=TIER_HOOK)
+
+def declare_tier_slot(module, func):
+    '''
+    Declare the indirection slot calls to func go through, which the host
+    points at an optimized version, and the counter deciding when
+    '''
+    slot = ir.GlobalVariable(module, func.type, name=TIER_SLOT + func.name)
+    slot.initializer = func
+    counter = ir.GlobalVariable(module, i32, name=TIER_COUNT + func.name)
+    counter.initializer = ir.Constant(i32, 0)
+
+def tier_tick(builder, loop=False):
+    '''
+    Count a function entry or loop back edge and report the function to the
+    host when the count reaches TIER_THRESHOLD
+    At a back edge of a hot function, branch to a new block once the host
+    has set the osr slot; tier_exits fills it
+    Return that block, None for an entry or untiered code
+    '''
+    module = builder.module
+    if TIER_HOOK not in module.globals:
+        return None
+    name = builder.function.name
+    counter = module.globals[TIER_COUNT + name]
+    count = builder.add(builder.load(counter), ir.Constant(i32, 1))
+    builder.store(count, counter)
+    hot = builder.icmp_unsigned('>=', count, ir.Constant(i32, TIER_THRESHOLD))
+    exit_block = None
+    with builder.if_then(hot, likely=False):
+        first = builder.icmp_unsigned('==', count, ir.Constant(i32, TIER_THRESHOLD))
+        with builder.if_then(first):
+            string = name + "\0"
+            c_name = ir.Constant(ir.ArrayType(ir.IntType(8), len(string)), bytearray(string.encode("utf8")))
+            global_name = get_global_format(builder, TIER_NAME + name, c_name)
+            builder.call(module.globals[TIER_HOOK], [builder.bitcast(global_name, ir.IntType(8).as_pointer())])
+        if loop:
+            slot = module.globals.get(TIER_OSR + name)
+            if slot is None:
+                slot = ir.GlobalVariable(module, ir.IntType(8).as_pointer(), name=TIER_OSR + name)
+                slot.initializer = ir.Constant(slot.type.pointee, None)
+            ready = builder.icmp_unsigned('!=', builder.load(slot), ir.Constant(slot.type.pointee, None))
+            exit_block = builder.append_basic_block('tier_exit')
+            stay = builder.append_basic_block('tier_stay')
+            builder.cbranch(ready, exit_block, stay)
+            builder.position_at_end(stay)
+    return exit_block
+
+def locals_of(func):
+    ''' The allocas of func, all at the top of its entry block '''
+    return [instr for instr in func.entry_basic_block.instructions
+            if isinstance(instr, ir.AllocaInstr)]
+
+def tier_entry_type(func):
+    ''' Type of the loop entry of func: its arguments, the loop, its locals '''
+    fnty = func.function_type
+    return ir.FunctionType(fnty.return_type, list(fnty.args) + [i32] +
+                           [slot.type.pointee for slot in locals_of(func)])
+
+def tier_exits(func, loops):
+    '''
+    Fill the blocks tier_tick branches to: call the loop entry the osr slot
+    points at with the arguments, the loop and the value of every local,
+    and return what it returns
+    '''
+    module = func.module
+    fnty = tier_entry_type(func)
+    slots = locals_of(func)
+    for loop, block in enumerate(loops):
+        if block is None:
+            continue
+        builder = ir.IRBuilder(block)
+        entry = builder.bitcast(builder.load(module.globals[TIER_OSR + func.name]), fnty.as_pointer())
+        values = [builder.load(slot) for slot in slots]
+        result = builder.call(entry, list(func.args) + [ir.Constant(i32, loop)] + values)
+        if fnty.return_type == ir.VoidType():
+            builder.ret_void()
+        else:
+            builder.ret(result)
+
+def process(ast, module, only=None, osr=False):
+    # outermost scope: function name -> (function type, cint flag per argument)
+    functions = Scope()
+    if ast.externs is not None:
+        process_externs(ast.externs, module, functions)
+    declare_print_function(module)
+    process_funcs(ast.funcs, module, functions, only, osr)
+
+def process_externs(ast, module, functions):
+    externList = ast.externs
     for extern in externList:
-        process_extern(extern, module, *sysArgs)
+        process_extern(extern, module, functions)
 
-def process_funcs(ast, module, known_funcs):
-    funcList = ast[strings.funcs]
+def process_funcs(ast, module, functions, only=None, osr=False):
+    funcList = ast.funcs
     for i in funcList:
-        convert_func(i, module, known_funcs)
-
-def process_extern(extern, module, *sysArgs):
-    args = []
-    func_name = extern["globid"]
-    if "tdecls" in extern:
-        for arg in extern["tdecls"]["types"]:
+        if only is not None and i.globid not in only:
+            symbols = functions.child()
+            symbols['cint'] = set()
+            declare_func(i, module, functions, symbols)
+            continue
+        # error context is only formatted when conversion fails
+        try:
+            convert_func(i, module, functions, osr)
+        except KeyError as err:
+            raise RuntimeError('error converting function {}: cannot find {}'.format(i.globid, err))
+
+def process_extern(extern, module, functions):
+    args, cint_args = [], []
+    func_name = extern.globid
+    if extern.tdecls is not None:
+        for arg in extern.tdecls.types:
             args.append(ir_type(arg))
+            cint_args.append("cint" in arg)
     if func_name in ["getarg", "getargf"]:
-        declare_built_int_functions(module, func_name, *sysArgs)
+        func = declare_built_int_functions(module, func_name)
     else:
-        returnType = ir_type(extern["ret_type"])
+        returnType = ir_type(extern.ret_type)
         fnty = ir.FunctionType(returnType, args)
         func = ir.Function(module, fnty, name=func_name)
+    functions[func_name] = (func.function_type, cint_args)
 
-def declare_built_int_functions(module, func_name, sys_args):
+def declare_built_int_functions(module, func_name):
     '''
-    Declare getarg and getargf functions
+    Declare getarg and getargf functions: a bounds checked load from the
+    argument buffer, 0 when the index is out of range like ekrt.c
     '''
-    # parse system arguments
     ret_type = i32 if func_name == "getarg" else f32
-    sys_args = list(map(float, sys_args))
-    if ret_type == i32:
-        sys_args = list(map(int, sys_args))
-    array_type = ir.ArrayType(ret_type, len(sys_args))
-    arr = ir.Constant(array_type, sys_args)
+    count = declare_arg_global(module, ARG_COUNT, i32)
+    values = declare_arg_global(module, ARG_INTS if ret_type == i32 else ARG_FLOATS,
+                                ret_type.as_pointer())
 
     # declare function
     fnty = ir.FunctionType(ret_type, [i32])
@@ -96,132 +374,197 @@ def declare_built_int_functions(module, func_name, sys_args):
 
     #function arguments
     index = func.args[0]
-    ptr_arg = builder.alloca(i32)
-    builder.store(index, ptr_arg)
-    value = builder.load(ptr_arg)
-
-    # insert sys args to arr
-    for index, arg in enumerate(sys_args):
-        number = ir.Constant(ret_type, arg)
-        builder.insert_value(arr, number, index)
-    ptr = builder.alloca(array_type)
-    builder.store(arr, ptr)
-
-    int_0 = ir.Constant(i32, 0)
-    address = builder.gep(ptr, [int_0,value])
-    builder.ret(builder.load(address))
-
-def convert_func(ast, module, known_funcs):
-    func_name = ast[strings.globid]
-    symbols = {}
-    symbols['cint'] = set()
-    symbols[strings.cint_args] = {}
-    symbols[strings.cint_args][func_name] = []
 
-    returnType = ir_type(ast[strings.ret_type])
-    
+    # unsigned compare also rejects negative indices
+    in_range = builder.icmp_unsigned('<', index, builder.load(count))
+    with builder.if_then(in_range, likely=True):
+        address = builder.gep(builder.load(values), [index])
+        builder.ret(builder.load(address))
+    builder.ret(ir.Constant(ret_type, 0))
+    return func
+
+def declare_arg_global(module, name, vtype):
+    ''' External global of the argument buffer, declared once per module '''
+    if name in module.globals:
+        return module.globals[name]
+    return ir.GlobalVariable(module, vtype, name=name)
+
+def declare_func(ast, module, functions, symbols):
+    '''
+    Declare the function of ast, visible to itself and the functions after it
+    Return the function and its argument names
+    '''
+    returnType = ir_type(ast.ret_type)
+
     # add arguments to list, check noalias attributes
-    if strings.vdecls in ast:
-        argument_types, argument_names, is_noalias = parse_vdecls(ast[strings.vdecls], symbols, func_name)
+    if ast.vdecls is not None:
+        argument_types, argument_names, is_noalias, cint_args = parse_vdecls(ast.vdecls, symbols)
     else:
-        argument_types, argument_names, is_noalias = [], [], []
-    
-    # declare function
+        argument_types, argument_names, is_noalias, cint_args = [], [], [], []
+
     fnty = ir.FunctionType(returnType, argument_types)
-    func = ir.Function(module, fnty, name=func_name)
-    known_funcs[func_name] = (fnty, symbols[strings.cint_args][func_name])
+    func = ir.Function(module, fnty, name=ast.globid)
+    for index, argument in enumerate(func.args):
+        if is_noalias[index]:
+            argument.add_attribute('noalias')
+    functions[ast.globid] = (fnty, cint_args)
+    return func, argument_names
 
-    # add entry
+def convert_func(ast, module, functions, osr=False):
+    symbols = functions.child()
+    symbols['cint'] = set()
+    symbols['osr'] = False
+
+    func, argument_names = declare_func(ast, module, functions, symbols)
+    if TIER_HOOK in module.globals:
+        declare_tier_slot(module, func)
+    loops = func_body(ast, func, argument_names, symbols)
+    if TIER_HOOK in module.globals:
+        tier_exits(func, loops)
+    if osr and loops:
+        convert_tier_entry(ast, module, functions, func)
+    return func.function_type
+
+def func_body(ast, func, argument_names, symbols):
+    '''
+    Generate the body of func, whose arguments come first in its type
+    Return the osr blocks of its loops in source order (see while_stmt)
+    '''
+    fnty = func.function_type
+    argument_types = fnty.args
+    symbols['loops'] = []
+
+    # add entry; local slots are added at its top by their own builder
     entry = func.append_basic_block('entry')
     builder = ir.IRBuilder(entry)
-
-    # add parameter info
-    known_funcs[func_name] = (fnty, symbols[strings.cint_args][func_name])
-
-    # populate known funcs
-    for name, t in known_funcs.items():
-        symbols[name] = t[0]
-        symbols[strings.cint_args][name] = t[1]
+    symbols['allocas'] = ir.IRBuilder(entry)
 
     # go through arguments
-    for index, argument in enumerate(func.args):
-        if is_noalias[index]:
-            argument.add_attribute('noalias')
-        var_name = argument_names[index]
+    for index, var_name in enumerate(argument_names):
+        argument = func.args[index]
         var_type = argument_types[index]
 
         if var_type.is_pointer:
             ptr = argument
             symbols[var_name] = ptr
         else:
-            ptr = builder.alloca(var_type)
+            ptr = entry_alloca(builder, symbols, var_type)
             symbols[var_name] = ptr
             builder.store(argument, ptr)
-    
-    returned = blk(ast[strings.blk], builder, symbols)
-    if ast[strings.ret_type] == 'void':
+
+    tier_tick(builder)
+    returned = blk(ast.blk, builder, symbols)
+    if ast.ret_type == 'void':
         builder.ret_void()
-        return fnty
-    if not returned:
+    elif not returned:
         raise RuntimeError("function missing return statement")
+    return symbols['loops']
 
-def parse_vdecls(ast, symbols, func_name):
-    type_list, name_list, is_noalias = [], [], []
-
-    for var in ast["vars"]:
-        if "cint" in var[strings.typ]:
-            symbols["cint"].add(var["var"])
-            symbols[strings.cint_args][func_name].append(True)
+def convert_tier_entry(ast, module, functions, func):
+    '''
+    Define the loop entry of func (TIER_ENTRY + name) that tiered code
+    switches to: func with the loop and the values of its locals as extra
+    arguments, whose first block stores them and jumps to the head of that
+    loop; the code before it is never reached and optimized away
+    '''
+    symbols = functions.child()
+    symbols['cint'] = set()
+    symbols['osr'] = True
+    argument_names = parse_vdecls(ast.vdecls, symbols)[1] if ast.vdecls is not None else []
+    entry_func = ir.Function(module, tier_entry_type(func), name=TIER_ENTRY + func.name)
+    loops = func_body(ast, entry_func, argument_names, symbols)
+
+    # a new first block takes the allocas and the dispatch
+    body = entry_func.entry_basic_block
+    slots = locals_of(entry_func)
+    start = entry_func.append_basic_block('tier_entry')
+    entry_func.blocks.remove(start)
+    entry_func.blocks.insert(0, start)
+    body.instructions = body.instructions[len(slots):]
+    for slot in slots:
+        slot.parent = start
+    start.instructions = slots
+
+    builder = ir.IRBuilder(start)
+    loop_arg = len(argument_names)
+    for slot, value in zip(slots, entry_func.args[loop_arg + 1:]):
+        builder.store(value, slot)
+    unknown = entry_func.append_basic_block('tier_unknown')
+    ir.IRBuilder(unknown).unreachable()
+    switch = builder.switch(entry_func.args[loop_arg], unknown)
+    for loop, block in enumerate(loops):
+        switch.add_case(ir.Constant(i32, loop), block)
+
+def parse_vdecls(ast, symbols):
+    type_list, name_list, is_noalias, cint_args = [], [], [], []
+
+    for var in ast.vars:
+        if "cint" in var.type:
+            symbols["cint"].add(var.var)
+            cint_args.append(True)
         else:
-            symbols[strings.cint_args][func_name].append(False)
-        type_list.append(ir_type(var["type"]))
-        name_list.append(var["var"])
-        is_noalias.append("noalias" in var["type"])
+            cint_args.append(False)
+        type_list.append(ir_type(var.type))
+        name_list.append(var.var)
+        is_noalias.append("noalias" in var.type)
 
-    return [type_list, name_list, is_noalias]
+    return [type_list, name_list, is_noalias, cint_args]
 
 def blk(ast, builder, symbols):
-    if strings.contents not in ast:
+    if ast.contents is None:
         return False
     
-    legacy = copy.copy(symbols)
-    for statement in ast[strings.contents][strings.stmts]:
-        if stmt(statement, builder, legacy):
+    scope = symbols.child()
+    for statement in ast.contents.stmts:
+        if stmt(statement, builder, scope):
             return True
     return False
 
-def stmt(ast, builder, symbols):
-    name = ast["name"]
-    
-    if name == 'ret':
+class StmtGenerator(ekast.Visitor):
+    '''
+    Emit code for a statement
+    Return True if the statement always returns from the function
+    '''
+    def visit_Ret(self, ast, builder, symbols):
         return return_stmt(ast, builder, symbols)
-    elif name == 'expstmt':
-        expression(ast[strings.exp], symbols, builder)
+
+    def visit_ExpStmt(self, ast, builder, symbols):
+        expression(ast.exp, symbols, builder)
         return False
-    elif name == 'if':
+
+    def visit_If(self, ast, builder, symbols):
         return if_stmt(ast, builder, symbols)
-    elif name == 'while':
+
+    def visit_While(self, ast, builder, symbols):
         while_stmt(ast, builder, symbols)
         return False
-    elif name == 'blk':
-        return blk(ast[strings.contents], builder, symbols)
-    elif name == 'print':
+
+    def visit_BlkStmt(self, ast, builder, symbols):
+        return blk(ast.contents, builder, symbols)
+
+    def visit_Print(self, ast, builder, symbols):
         print_number(ast, builder, symbols)
-    elif name == 'printslit':
+        return False
+
+    def visit_PrintSlit(self, ast, builder, symbols):
         print_slit(ast, builder, symbols)
         return False
-    elif name == 'vardeclstmt':
+
+    def visit_VarDeclStmt(self, ast, builder, symbols):
         vardeclstmt(ast, builder, symbols)
         return False
-    else:
-        raise RuntimeError('error: ast is not processed: ' + str(ast))
+
+stmt_generator = StmtGenerator()
+
+def stmt(ast, builder, symbols):
+    return stmt_generator.visit(ast, builder, symbols)
 
 def return_stmt(ast, builder, symbols):
-    if "exp" not in ast:
+    if ast.exp is None:
         builder.ret_void()
         return True
     
-    ret_exp = expression(ast["exp"], symbols, builder)
+    ret_exp = expression(ast.exp, symbols, builder)
     ret_exp = get_value(ret_exp, builder)
     builder.ret(ret_exp)
     return True
@@ -231,7 +574,7 @@ def print_number(ast, builder, symbols):
     print i1, i32, f32
     note: the floar need to be converted to double when using printf
     '''
-    value = expression(ast["exp"], symbols, builder)
+    value = expression(ast.exp, symbols, builder)
     value = get_value(value, builder)
     if value.type == i1:
         value = builder.zext(value, i32)
@@ -250,7 +593,7 @@ def print_slit(ast, builder, symbols):
     print string with printf
     note: string need 
     '''
-    string = ast['string']
+    string = ast.string
     if len(string) == 0:
         return None
     voidptr_ty = ir.IntType(8).as_pointer()
@@ -276,57 +619,83 @@ def while_stmt(ast, builder, symbols):
     # init
     w_body_block = builder.append_basic_block("while_body")
     w_after_block = builder.append_basic_block("while_end")
+    # loops are numbered in source order, the same in every module
+    loops = symbols['loops']
+    loop = len(loops)
+    loops.append(None)
 
     # begin
-    cond = expression(ast[strings.cond], symbols, builder)
+    cond = expression(ast.cond, symbols, builder)
     builder.cbranch(cond, w_body_block, w_after_block)
 
+    # a loop entry resumes here, testing the condition again
+    if symbols['osr']:
+        loops[loop] = builder.append_basic_block("while_resume")
+        with builder.goto_block(loops[loop]):
+            cond = expression(ast.cond, symbols, builder)
+            builder.cbranch(cond, w_body_block, w_after_block)
+
     # while loop
     builder.position_at_start(w_body_block)
-    stmt(ast["stmt"], builder, symbols)
-    cond = expression(ast[strings.cond], symbols, builder)
+    stmt(ast.stmt, builder, symbols)
+    exit_block = tier_tick(builder, loop=True)
+    if exit_block is not None:
+        loops[loop] = exit_block
+    cond = expression(ast.cond, symbols, builder)
     builder.cbranch(cond, w_body_block, w_after_block)
 
     # end
     builder.position_at_start(w_after_block)
 
 def if_stmt(ast, builder, symbols):
-    cond = expression(ast["cond"], symbols, builder)
+    cond = expression(ast.cond, symbols, builder)
     returned = False
-    if "else_stmt" in ast:
+    if ast.else_stmt is not None:
         with builder.if_else(cond) as (then, otherwise):
             with then:
-                returned_then = stmt(ast["stmt"], builder, symbols)
+                returned_then = stmt(ast.stmt, builder, symbols)
             with otherwise:
-                returned_otherwise = stmt(ast["else_stmt"], builder, symbols)
+                returned_otherwise = stmt(ast.else_stmt, builder, symbols)
         returned = returned_then and returned_otherwise
     else:
         with builder.if_then(cond):
-            stmt(ast["stmt"], builder, symbols)
+            stmt(ast.stmt, builder, symbols)
     
     if returned:
         endif = builder.block
         builder.function.blocks.remove(endif)
     return returned
 
+def entry_alloca(builder, symbols, vtype):
+    '''
+    Stack slot of vtype after the allocas at the top of the entry block,
+    added by the function's alloca builder (symbols['allocas']), so a
+    declaration in a loop reuses one slot and mem2reg can promote it
+    '''
+    ptr = symbols['allocas'].alloca(vtype)
+    if builder.block is ptr.parent:
+        # the instructions after the alloca moved, keep appending at the end
+        builder.position_at_end(builder.block)
+    return ptr
+
 def vardeclstmt(ast, builder, symbols):
-    vdecl = ast[strings.vdecl]
-    var_type = vdecl[strings.typ]
-    var_name = vdecl[strings.var]
+    vdecl = ast.vdecl
+    var_type = vdecl.type
+    var_name = vdecl.var
     if 'ref' in var_type:
         ref_var_decl(ast, builder, symbols)
         return 
 
     vtype = ir_type(var_type)
-    ptr = builder.alloca(vtype)
+    ptr = entry_alloca(builder, symbols, vtype)
     symbols[var_name] = ptr
     cint = False
     # assign value to variable
-    if "cint" in ast[strings.vdecl][strings.typ]:
+    if "cint" in var_type:
         cint = True
         symbols["cint"].add(var_name)
-    if "exp" in ast:
-        exp = ast[strings.exp]
+    if ast.exp is not None:
+        exp = ast.exp
         value = expression(exp, symbols, builder, cint = cint)
         value = get_value(value, builder)
 
@@ -347,93 +716,91 @@ def vardeclstmt(ast, builder, symbols):
         raise RuntimeError('error: cannot declare variable: ' + str(ast), err)
 
 def ref_var_decl(ast, builder, symbols):
-    vdecl = ast[strings.vdecl]
-    var_name = vdecl[strings.var]
-    exp = ast[strings.exp]
+    var_name = ast.vdecl.var
+    exp = ast.exp
     pointee = expression(exp, symbols, builder)
     symbols[var_name] = pointee
 
-def expression(ast, symbols, builder, neg=False, exception=False, cint=False):
-    name = ast[strings.name]
-    try:
-        if name == strings.uop:
-            return uop(ast, symbols, builder, cint)
-        if name == strings.litExp or name == "flit":
-            if cint:
-                limit = 2147483647
-                if neg:
-                    limit += 1
-                if ast['value'] > limit or ast['value'] < -2147483648:
-                    overflows(ast, builder)
-                if exception and ast['value'] == 2147483648:
-                    raise Error2147483648
-            return ir.Constant(ir_type(ast[strings.typ]), ast['value'])
-        elif name == 'slit':
-            return ast['value']
-        elif name == strings.varExp:
-            name = ast[strings.var]
-            try:
-                return symbols[name]
-            except:
-                raise RuntimeError('error: cannot find variable: ' + str(ast))
-        elif name == 'funccall':
-            func_name = ast[strings.globid]
-            fn = builder.module.globals.get(func_name)
-            params = ast[strings.params]
-
-            # prepare parameters
-            if func_name == "getarg" or func_name == "getargf":
-                # there is only one parameter
-                parameter = expression(params["exps"][0], symbols, builder)
-                parameter = get_value(parameter, builder)
-                parameters = [ parameter ]
-            else:
-                parameters = prepare_parameters(func_name, params, symbols, builder)
-
-            return builder.call(fn, parameters)
-        elif name == strings.binop:
-            target_type = ast[strings.typ]
-            return binop(ast, symbols, builder, target_type, cint = cint)
-
-        elif name == strings.assign:
-            var_name = ast[strings.var]
-
-            if var_name not in symbols:
-                raise RuntimeError('error: variable name has not been declared: ' + var_name)
-
-            ptr = symbols[var_name]
-
-            if var_name in symbols["cint"]:
-                ast[strings.typ] = "cint"
-
-            cint = False
-            if "cint" in ast["type"]:
-                cint = True
-
-            value = expression(ast[strings.exp], symbols, builder, cint = cint)
-            assign_value(builder, ptr, value)
-            return
-        
-        elif name == strings.caststmt:
-            target_type = ir_type(ast[strings.typ])
-            source_type = ir_type(ast[strings.exp][strings.typ])
-            value = expression(ast[strings.exp], symbols, builder)
-            if source_type == target_type:
-                return value
-            else:
-                # only handled float -> int and int -> float
-                if source_type == f32 and target_type == i32:
-                    return builder.fptosi(value, target_type, name='fptosi')
-                elif source_type == i32 and target_type == f32:
-                    return builder.sitofp(value, target_type, name='fptosi')
-                else:
-                    # in case of need
-                    pass
+class ExpGenerator(ekast.Visitor):
+    '''
+    Emit code for an expression
+    Return the value, or the pointer of a variable
+    '''
+    def visit_UOp(self, ast, symbols, builder, neg, exception, cint):
+        return uop(ast, symbols, builder, cint)
+
+    def visit_Lit(self, ast, symbols, builder, neg, exception, cint):
+        if cint:
+            limit = 2147483647
+            if neg:
+                limit += 1
+            if ast.value > limit or ast.value < -2147483648:
+                overflows(ast, builder)
+            if exception and ast.value == 2147483648:
+                raise Error2147483648
+        return ir.Constant(ir_type(ast.type), ast.value)
+
+    def visit_VarVal(self, ast, symbols, builder, neg, exception, cint):
+        name = ast.var
+        try:
+            return symbols[name]
+        except KeyError:
+            raise RuntimeError('error: cannot find variable: ' + str(ast))
+
+    def visit_FuncCall(self, ast, symbols, builder, neg, exception, cint):
+        func_name = ast.globid
+        fn = builder.module.globals.get(func_name)
+        params = ast.params
+
+        # prepare parameters
+        if func_name == "getarg" or func_name == "getargf":
+            # there is only one parameter
+            parameter = expression(params.exps[0], symbols, builder)
+            parameter = get_value(parameter, builder)
+            parameters = [ parameter ]
         else:
-            raise RuntimeError('error: ast is not processed: ' + str(ast))
+            parameters = prepare_parameters(func_name, params, symbols, builder)
 
-    except KeyError as err:
-        raise RuntimeError('error converting: ' + str(ast), err)
+        # tiered code calls through the slot the host may repoint
+        slot = builder.module.globals.get(TIER_SLOT + func_name)
+        if slot is not None:
+            fn = builder.load(slot)
+        return builder.call(fn, parameters)
+
+    def visit_BinOp(self, ast, symbols, builder, neg, exception, cint):
+        target_type = ast.type
+        return binop(ast, symbols, builder, target_type, cint = cint)
+
+    def visit_Assign(self, ast, symbols, builder, neg, exception, cint):
+        var_name = ast.var
+
+        if var_name not in symbols:
+            raise RuntimeError('error: variable name has not been declared: ' + var_name)
+
+        ptr = symbols[var_name]
+
+        if var_name in symbols["cint"]:
+            ast.type = "cint"
+
+        cint = False
+        if "cint" in ast.type:
+            cint = True
+
+        value = expression(ast.exp, symbols, builder, cint = cint)
+        assign_value(builder, ptr, value)
+        return
+
+    def visit_Cast(self, ast, symbols, builder, neg, exception, cint):
+        value = expression(ast.exp, symbols, builder)
+        cast = CASTS.get((TYPE_KINDS[ast.exp.type], TYPE_KINDS[ast.type]))
+        if cast is None:
+            return value
+        return cast(builder, get_value(value, builder))
+
+exp_generator = ExpGenerator()
+
+def expression(ast, symbols, builder, neg=False, exception=False, cint=False):
+    return exp_generator.visit(ast, symbols, builder, neg, exception, cint)
 
 def get_value(exp, builder):
     if exp.type.is_pointer:
@@ -441,72 +808,36 @@ def get_value(exp, builder):
     return exp
 
 def binop(ast, symbols, builder, target_type, cint = False):
-    lhs = expression(ast["lhs"], symbols, builder, cint = cint)
+    lhs = expression(ast.lhs, symbols, builder, cint = cint)
     lhs = get_value(lhs, builder)
-    rhs = expression(ast["rhs"], symbols, builder, cint = cint)
+    rhs = expression(ast.rhs, symbols, builder, cint = cint)
     rhs = get_value(rhs, builder)
-    op = ast["op"]
-    flags= ["fast"]
-
-    try:
-        if cint:
-            return check_int(lhs, rhs, builder, op)
-        if op == "and":
-            return builder.and_(lhs, rhs, name="and", flags=())
-        elif op == "or":
-            return builder.or_(lhs, rhs, name="or", flags=())
-        elif target_type == "float":
-            if op == 'add':
-                return builder.fadd(lhs, rhs, name="add", flags=flags)
-            elif op == 'sub':
-                return builder.fsub(lhs, rhs, name='sub', flags=flags)
-            elif op == 'mul':
-                return builder.fmul(lhs, rhs, name='mul', flags=flags)
-            elif op == 'div':
-                return builder.fdiv(lhs, rhs, name='div', flags=flags)
-        elif target_type == "int":
-            if op == 'add':
-                return builder.add(lhs, rhs, name="add")
-            elif op == 'sub':
-                return builder.sub(lhs, rhs, name='sub')
-            elif op == 'mul':
-                return builder.mul(lhs, rhs, name='mul')
-            elif op == 'div':
-                return builder.sdiv(lhs, rhs, name='div')
-        elif target_type == "bool":
-            if "int" in ast["lhs"]["type"]:
-                if op == 'eq':
-                    return builder.icmp_signed('==', lhs, rhs, name="eq")
-                elif op == 'lt':
-                    return builder.icmp_signed('<', lhs, rhs, name="lt")
-                elif op == 'gt':
-                    return builder.icmp_signed('>', lhs, rhs, name="gt")
-            elif "float" in ast["lhs"]["type"]:
-                if op == 'eq':
-                    return builder.fcmp_ordered('==', lhs, rhs, name="eq", flags=flags)
-                elif op == 'lt':
-                    return builder.fcmp_ordered('<', lhs, rhs, name="lt", flags=flags)
-                elif op == 'gt':
-                    return builder.fcmp_ordered('>', lhs, rhs, name="gt", flags=flags)
-            else:
-                pass
-        else:
-            raise RuntimeError('error: ast is not processed: ' + str(ast))
-    except:
-        raise RuntimeError('error: cannot processing ast: ' + str(ast))
+    op = ast.op
+
+    # range analysis marks cint arithmetic that cannot overflow as safe
+    if getattr(ast, 'safe', False):
+        return BINOPS[op, 'int'](builder, lhs, rhs)
+    if cint:
+        return check_int(lhs, rhs, builder, op)
+    # keyed by the operand type: arithmetic keeps it, comparisons give bool
+    emit = BINOPS.get((op, TYPE_KINDS[ast.lhs.type]))
+    if emit is None:
+        raise RuntimeError('error: ast is not processed: ' + str(ast))
+    return emit(builder, lhs, rhs)
 
 def uop(ast, symbols, builder, cint = False):
     try:
-        uop_value = expression(ast["exp"], symbols, builder, neg=True, exception=True, cint = cint)
+        uop_value = expression(ast.exp, symbols, builder, neg=True, exception=True, cint = cint)
     except Error2147483648:
         return ir.Constant(i32, -2147483648)
 
     uop_value = get_value(uop_value, builder)
-    if ast["op"] == "minus":
-        if uop_value.type == i32:
-            if cint:
+    if ast.op == "minus":
+        if TYPE_KINDS[ast.type] != "float":
+            # range analysis marks negations that cannot overflow as safe
+            if cint and not getattr(ast, 'safe', False):
                 is_overflow = builder.icmp_signed('==', uop_value, ir.Constant(i32, -2147483648))
-                with builder.if_then(is_overflow):
+                with builder.if_then(is_overflow, likely=False):
                     overflows(None, builder)
             return builder.neg(uop_value, name="Minus")
         else:
@@ -519,20 +850,21 @@ def prepare_parameters(func_name, params, symbols, builder):
     if not params:
         return []
     parameters = []
-    fnArgs = symbols[func_name].args
-    exps = params[strings.exps]
+    fnty, cint_args = symbols[func_name]
+    fnArgs = fnty.args
+    exps = params.exps
     for i in range(len(exps)):
         param = exps[i]
         argType = fnArgs[i]
         if argType.is_pointer:
-            if strings.var not in param:
+            if not isinstance(param, (ekast.VarVal, ekast.Assign)):
                 raise RuntimeError("error: no variable object passed as ref type")
-            var_name = param[strings.var]
+            var_name = param.var
             parameters.append(
                 symbols[var_name]
             )
         else:
-            cint = symbols[strings.cint_args][func_name][i]
+            cint = cint_args[i]
             value = expression(param, symbols, builder, cint = cint)
             value = get_value(value, builder)
             parameters.append(value)
@@ -553,111 +885,212 @@ def assign_value(builder, ptr, value):
 
 def ir_type(string):
     # convert kaleidoscope type to ir type
-    if "ref" in string:
-        if "int" in string:
-            return ir.PointerType(i32)
-        return ir.PointerType(f32)
-    if "int" in string:
-        return i32
-    if "float" in string:
-        return f32
-    if "bool" in string:
-        return i1
-    return ir.VoidType()
+    return IR_TYPES[string]
 
 def check_int(lhs, rhs, builder, op):
-    result = None
-    if op == 'mul':
-        result = builder.smul_with_overflow(lhs, rhs, name='mul')
-    elif op == 'div':
-        
-
+    if op == 'div':
         l = builder.icmp_signed('==', lhs, ir.Constant(i32,-2147483648), name="eq")
         r = builder.icmp_signed('==', rhs, ir.Constant(i32,-1), name="eq")
         rIsZero = builder.icmp_signed('==', rhs, ir.Constant(i32,0), name="eq")
         cond = builder.and_(l, r, name='and')
         cond2 = builder.or_(cond, rIsZero, name='or')
-        with builder.if_then(cond2):
+        with builder.if_then(cond2, likely=False):
             overflows(None, builder)
         a = builder.sdiv(lhs, rhs, name='div')
         return a
 
-    elif op == 'add':
-        result = builder.sadd_with_overflow(lhs, rhs, name="add")
-    elif op == 'sub':
-        result = builder.ssub_with_overflow(lhs, rhs, name='sub')
-    
-    if result is not None:
+    with_overflow = OVERFLOW_OPS.get(op)
+    if with_overflow is not None:
+        result = with_overflow(builder, lhs, rhs)
         is_overflow = builder.extract_value(result, 1)
 
-        with builder.if_then(is_overflow):
+        with builder.if_then(is_overflow, likely=False):
             overflows(None, builder)
 
-
         return builder.extract_value(result, 0)
 
-
-    if op == 'eq':
-        return builder.icmp_signed('==', lhs, rhs, name="eq")
-    elif op == 'lt':
-        return builder.icmp_signed('<', lhs, rhs, name="lt")
-    elif op == 'gt':
-        return builder.icmp_signed('>', lhs, rhs, name="gt")
+    emit = BINOPS.get((op, 'int'))
+    if emit is not None:
+        return emit(builder, lhs, rhs)
 
 class Error2147483648(Exception):
     pass
 
-def overflows(ast, builder):
-    message = {"string": "Error: cint value overflowed", "name": "slit"}
+def overflow_handler(module):
+    '''
+    The function printing the cint overflow message, defined once per module
+    cold and noinline, so the checks branch to one call out of line
+    '''
+    if OVERFLOW_HANDLER in module.globals:
+        return module.globals[OVERFLOW_HANDLER]
+    func = ir.Function(module, ir.FunctionType(ir.VoidType(), []), name=OVERFLOW_HANDLER)
+    func.linkage = 'internal'
+    func.attributes.add('cold')
+    func.attributes.add('noinline')
+    builder = ir.IRBuilder(func.append_basic_block('entry'))
+    message = ekast.PrintSlit("Error: cint value overflowed")
     print_slit(message, builder, None)
+    builder.ret_void()
+    return func
+
+def overflows(ast, builder):
+    builder.call(overflow_handler(builder.module), [])
 
 # jit compiler
-def execute(module, optimization):
-    parsed_module = llvm.parse_assembly(str(module))
+def pipeline(optimization, inline_threshold=None, passes=()):
+    '''
+    Return the Pipeline for a Pipeline, an OPT_LEVELS name or a bool, where
+    True is the old -O
+    '''
+    if isinstance(optimization, Pipeline):
+        return optimization
+    if optimization is None or isinstance(optimization, bool):
+        optimization = '3' if optimization else '0'
+    if optimization not in OPT_LEVELS:
+        raise RuntimeError('error: unknown optimization level: ' + optimization)
+    for name in passes:
+        if name not in PASSES:
+            raise RuntimeError('error: unknown pass: ' + name)
+    level, size_level = OPT_LEVELS[optimization]
+    return Pipeline(level, size_level, inline_threshold, tuple(passes))
+
+def optimize(parsed_module, optimization=True):
+    '''
+    Run the passes of an optimization setting (see pipeline) on a parsed
+    module: the PassManagerBuilder function and module pipelines of its
+    levels, then its --passes
+    Return whether they modified the module
+    '''
+    settings = pipeline(optimization)
+    threshold = settings.threshold()
+
+    pmb = llvm.PassManagerBuilder()
+    pmb.opt_level = settings.level
+    pmb.size_level = settings.size_level
+    if settings.level > 1 or settings.inline_threshold is not None:
+        pmb.inlining_threshold = threshold
+
+    fpm = llvm.create_function_pass_manager(parsed_module)
+    pm = llvm.ModulePassManager()
+    if settings.level > 0:
+        pmb.populate(fpm)
+        pmb.populate(pm)
+    for name in settings.passes:
+        PASSES[name](pm, threshold)
+
+    is_modified = False
+    fpm.initialize()
+    for func in parsed_module.functions:
+        if not func.is_declaration:
+            is_modified = fpm.run(func) or is_modified
+    fpm.finalize()
+    return pm.run(parsed_module) or is_modified
+
+def prepare(module, optimization, timer=None, report=True):
+    '''
+    Parse the module ir, run the optimization passes and verify
+    timer is an optional phases.PhaseTimer; report prints whether the
+    passes modified the module
+    Return parsed module
+    '''
+    parsed_module, is_modified = prepare_module(module, optimization, timer)
+    if report:
+        report_modified(is_modified)
+    return parsed_module
 
-    if optimization:
-        # initialize pass manager builder
-        pmb = llvm.PassManagerBuilder()
-        pmb.opt_level = 3
+def prepare_module(module, optimization, timer=None):
+    '''
+    prepare without the report
+    Return parsed module and whether the passes modified it, None when no
+    pass ran
+    '''
+    with timed(timer, 'str(module)'):
+        text = str(module)
+    with timed(timer, 'parse_assembly'):
+        parsed_module = llvm.parse_assembly(text)
 
-        # initialize function pass manager
-        fpm = llvm.create_function_pass_manager(parsed_module)
-        pmb.populate(fpm)
+    is_modified = None
+    optimization = pipeline(optimization)
+    if optimization:
+        with timed_passes(timer, 'optimize'):
+            is_modified = optimize(parsed_module, optimization)
 
-        # initialize module pass manager
-        pm = llvm.ModulePassManager()
-        pmb.populate(pm)
+    with timed(timer, 'verify'):
+        parsed_module.verify()
+    return parsed_module, is_modified
 
-        # add optimization passes
-        pm.add_constant_merge_pass()
-        pm.add_dead_arg_elimination_pass()
-        pm.add_function_attrs_pass()
-        pm.add_function_inlining_pass(200) # threshold = 200
-        pm.add_global_dce_pass()
-        pm.add_global_optimizer_pass()
-        pm.add_ipsccp_pass()
-        pm.add_dead_code_elimination_pass()
-        pm.add_cfg_simplification_pass()   
-        pm.add_gvn_pass()
-        pm.add_instruction_combining_pass()
-        pm.add_licm_pass()
-        pm.add_sccp_pass()
-        pm.add_sroa_pass()
-        pm.add_type_based_alias_analysis_pass()
-        pm.add_basic_alias_analysis_pass()
-
-        # run optimization passes on the module
-        is_modified = pm.run(parsed_module)
-
-        # check if the optimizations made any modification to the module
+def report_modified(is_modified):
+    ''' Print whether the optimizations modified the module, if any ran '''
+    if is_modified is not None:
         print("Optimizations made modification to the module: ", is_modified)
 
-    parsed_module.verify()
-    target_machine = llvm.Target.from_default_triple().create_target_machine()
-    engine = llvm.create_mcjit_compiler(parsed_module, target_machine)
-    engine.finalize_object()
-    entry = engine.get_function_address("run")
-    cfunc = CFUNCTYPE(c_int)(entry)
-    result = cfunc()
+
+class Program:
+    '''
+    A parsed module jit compiled by its own MCJIT engine, kept until close
+    so run can be called any number of times without compiling again
+    notify and getbuffer are the MCJIT object cache hooks
+    '''
+    def __init__(self, parsed_module, notify=None, getbuffer=None):
+        initialize_llvm()
+        target_machine = llvm.Target.from_default_triple().create_target_machine()
+        self.engine = llvm.create_mcjit_compiler(parsed_module, target_machine)
+        if notify or getbuffer:
+            self.engine.set_object_cache(notify, getbuffer)
+        self.engine.finalize_object()
+        self.entry = CFUNCTYPE(c_int)(self.engine.get_function_address("run"))
+
+    def run(self, args=()):
+        '''
+        Call run with the program arguments args
+        Runs from several threads take turns: the arguments are process wide
+        Return its exit status
+        '''
+        if self.engine is None:
+            raise RuntimeError('error: program is closed')
+        with arg_lock:
+            set_args(args)
+            return self.entry()
+
+    def close(self):
+        ''' Free the engine and the machine code '''
+        if self.engine is not None:
+            self.entry = None
+            self.engine.close()
+            self.engine = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_module(parsed_module, args=(), notify=None, getbuffer=None, timer=None):
+    '''
+    Jit compile a parsed module with MCJIT and call run once with the
+    program arguments args
+    notify and getbuffer are the MCJIT object cache hooks
+    Return the exit status of run
+    '''
+    with timed(timer, 'mcjit finalize'):
+        program = Program(parsed_module, notify, getbuffer)
+    try:
+        with timed(timer, 'run'):
+            return program.run(args)
+    finally:
+        program.close()
+
+def jit(module, optimization, args=(), timer=None):
+    '''
+    Optimize and jit compile module, then call run with the program
+    arguments args
+    Return parsed module and the exit status of run
+    '''
+    parsed_module = prepare(module, optimization, timer)
+    return parsed_module, run_module(parsed_module, args, timer=timer)
+
+def execute(module, optimization, args=(), timer=None):
+    parsed_module, result = jit(module, optimization, args, timer)
     print("\nexit: {}".format(result))
     return parsed_module
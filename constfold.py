@@ -0,0 +1,324 @@
+import math
+import operator
+import struct
+import sys
+import ekast
+import codegen
+
+INT_MIN = -2147483648
+INT_MAX = 2147483647
+
+ARITH = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul}
+COMPARE = {'eq': operator.eq, 'lt': operator.lt, 'gt': operator.gt}
+LOGIC = {'and': lambda l, r: l and r, 'or': lambda l, r: l or r}
+
+
+def wrap(value):
+    ''' value as an i32, wrapping like unchecked int arithmetic '''
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+def to_f32(value):
+    ''' value rounded to an f32, or None when that is not finite '''
+    try:
+        value = struct.unpack('f', struct.pack('f', value))[0]
+    except OverflowError:
+        return None
+    return value if math.isfinite(value) else None
+
+def sdiv(lhs, rhs):
+    # rounds toward zero like the sdiv instruction
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+def kind(exp):
+    return codegen.TYPE_KINDS.get(exp.type)
+
+def constant(exp):
+    '''
+    Python value of exp if it is a literal the folder may compute with:
+    bool, finite float or int in i32 range
+    Return None otherwise
+    '''
+    if not isinstance(exp, ekast.Lit):
+        return None
+    k = kind(exp)
+    if k == 'bool':
+        return exp.value == 'true'
+    if k == 'float':
+        return to_f32(float(exp.value))
+    if k in ('int', 'cint') and isinstance(exp.value, int) and INT_MIN <= exp.value <= INT_MAX:
+        return exp.value
+    return None
+
+def literal(type, value):
+    ''' Lit node of type for a python value, as the parser would build it '''
+    k = codegen.TYPE_KINDS[type]
+    if k == 'bool':
+        return ekast.Lit(type, 'true' if value else 'false')
+    if k == 'float':
+        return ekast.FLit(type, value)
+    return ekast.Lit(type, value)
+
+def walk(node):
+    ''' Every node below node, node included '''
+    if isinstance(node, list):
+        for value in node:
+            yield from walk(value)
+    elif isinstance(node, ekast.Node):
+        yield node
+        for field in node.fields:
+            yield from walk(getattr(node, field))
+
+def signatures(ast):
+    ''' Function name -> [(is ref, is cint)] per parameter '''
+    params = {}
+    if ast.externs is not None:
+        for extern in ast.externs.externs:
+            types = extern.tdecls.types if extern.tdecls is not None else []
+            params[extern.globid] = [('ref' in t, 'cint' in t) for t in types]
+    for func in ast.funcs.funcs:
+        types = [v.type for v in func.vdecls.vars] if func.vdecls is not None else []
+        params[func.globid] = [('ref' in t, 'cint' in t) for t in types]
+    return params
+
+
+class Folder(ekast.Visitor):
+    '''
+    Fold constant expressions of a checked ast in place, propagate the
+    values of locals that are declared once from a constant and never
+    written, and drop branches and loops with a constant condition
+    Expressions are visited with the cint flag codegen gives them: checked
+    cint arithmetic is folded only when it cannot overflow, and a warning
+    is printed when it always does; everything with a runtime effect
+    (overflow messages, division by zero, out of range literals or casts)
+    is left to codegen
+    Statements return their replacement (None drops them), expressions
+    their folded node
+    '''
+    def __init__(self, params):
+        super().__init__()
+        self.params = params
+
+    def visit_Prog(self, ast):
+        for func in ast.funcs.funcs:
+            self.visit(func)
+        return ast
+
+    def visit_Func(self, func):
+        self.func_name = func.globid
+        self.constants = {}
+        self.cint_names = set()
+        self.fixed = self.immutables(func)
+        if func.vdecls is not None:
+            for vdecl in func.vdecls.vars:
+                if 'cint' in vdecl.type:
+                    self.cint_names.add(vdecl.var)
+        self.visit(func.blk)
+        return func
+
+    def immutables(self, func):
+        '''
+        Names of the locals declared exactly once in func (parameters count)
+        that nothing can write: no assignment, not passed to a call (it may
+        take a ref) and not bound to a ref variable
+        '''
+        declared = {}
+        written = set()
+        if func.vdecls is not None:
+            for vdecl in func.vdecls.vars:
+                declared[vdecl.var] = 2
+        for node in walk(func.blk):
+            if isinstance(node, ekast.VarDeclStmt):
+                var = node.vdecl.var
+                # a ref variable is never a constant
+                declared[var] = declared.get(var, 0) + (2 if 'ref' in node.vdecl.type else 1)
+                if 'ref' in node.vdecl.type and isinstance(node.exp, (ekast.VarVal, ekast.Assign)):
+                    written.add(node.exp.var)
+            elif isinstance(node, ekast.Assign):
+                written.add(node.var)
+            elif isinstance(node, ekast.FuncCall) and node.params is not None:
+                for param in node.params.exps:
+                    if isinstance(param, (ekast.VarVal, ekast.Assign)):
+                        written.add(param.var)
+        return {var for var, count in declared.items() if count == 1 and var not in written}
+
+    def warn(self, what):
+        print('warning: In function {}, {} always overflows'.format(self.func_name, what),
+              file=sys.stderr)
+
+    # statements
+    def visit_Blk(self, blk):
+        if blk.contents is not None:
+            stmts = [self.visit(stmt) for stmt in blk.contents.stmts]
+            blk.contents.stmts = [stmt for stmt in stmts if stmt is not None]
+        return blk
+
+    def visit_BlkStmt(self, stmt):
+        self.visit(stmt.contents)
+        return stmt
+
+    def body(self, stmt):
+        # a dropped statement that is the body of another one becomes {}
+        stmt = self.visit(stmt)
+        return stmt if stmt is not None else ekast.BlkStmt(ekast.Blk())
+
+    def visit_If(self, stmt):
+        stmt.cond = self.fold(stmt.cond)
+        cond = constant(stmt.cond) if kind(stmt.cond) == 'bool' else None
+        if cond is None:
+            stmt.stmt = self.body(stmt.stmt)
+            if stmt.else_stmt is not None:
+                stmt.else_stmt = self.body(stmt.else_stmt)
+            return stmt
+        # the taken branch shares the scope of the if in codegen
+        branch = stmt.stmt if cond else stmt.else_stmt
+        return self.visit(branch) if branch is not None else None
+
+    def visit_While(self, stmt):
+        stmt.cond = self.fold(stmt.cond)
+        if kind(stmt.cond) == 'bool' and constant(stmt.cond) is False:
+            return None
+        stmt.stmt = self.body(stmt.stmt)
+        return stmt
+
+    def visit_VarDeclStmt(self, stmt):
+        vdecl = stmt.vdecl
+        if 'ref' in vdecl.type or stmt.exp is None:
+            return stmt
+        cint = 'cint' in vdecl.type
+        if cint:
+            self.cint_names.add(vdecl.var)
+        stmt.exp = self.fold(stmt.exp, cint)
+        value = constant(stmt.exp)
+        # only values the declaration stores without a conversion
+        same = kind(stmt.exp) == codegen.TYPE_KINDS[vdecl.type] or \
+            {kind(stmt.exp), codegen.TYPE_KINDS[vdecl.type]} <= {'int', 'cint'}
+        if value is not None and same and vdecl.var in self.fixed:
+            self.constants[vdecl.var] = value
+        return stmt
+
+    def visit_Ret(self, stmt):
+        if stmt.exp is not None:
+            stmt.exp = self.fold(stmt.exp)
+        return stmt
+
+    def visit_ExpStmt(self, stmt):
+        stmt.exp = self.fold(stmt.exp)
+        return stmt
+
+    def visit_Print(self, stmt):
+        stmt.exp = self.fold(stmt.exp)
+        return stmt
+
+    def visit_PrintSlit(self, stmt):
+        return stmt
+
+    # expressions
+    def fold(self, exp, cint=False):
+        return self.visit(exp, cint)
+
+    def visit_Lit(self, exp, cint):
+        return exp
+
+    def visit_VarVal(self, exp, cint):
+        if exp.var in self.constants:
+            return literal(exp.type, self.constants[exp.var])
+        return exp
+
+    def visit_FuncCall(self, exp, cint):
+        if exp.params is None:
+            return exp
+        params = self.params.get(exp.globid)
+        exps = exp.params.exps
+        for index, param in enumerate(exps):
+            if exp.globid in ('getarg', 'getargf'):
+                exps[index] = self.fold(param)
+            elif params is not None and index < len(params) and not params[index][0]:
+                exps[index] = self.fold(param, params[index][1])
+        return exp
+
+    def visit_Assign(self, exp, cint):
+        cint = exp.var in self.cint_names or 'cint' in (exp.type or '')
+        exp.exp = self.fold(exp.exp, cint)
+        return exp
+
+    def visit_Cast(self, exp, cint):
+        exp.exp = self.fold(exp.exp)
+        value = constant(exp.exp)
+        if value is None:
+            return exp
+        source, target = kind(exp.exp), kind(exp)
+        if (source, target) not in codegen.CASTS:
+            # codegen emits no cast for these, same kind or not
+            return literal(exp.type, value) if source == target or \
+                {source, target} <= {'int', 'cint'} else exp
+        if source == 'float':
+            # fptosi of a value out of range is poison
+            if not INT_MIN <= math.trunc(value) <= INT_MAX:
+                return exp
+            return literal(exp.type, math.trunc(value))
+        if target == 'float':
+            return literal(exp.type, to_f32(float(value)))
+        return literal(exp.type, int(value))
+
+    def visit_UOp(self, exp, cint):
+        exp.exp = self.fold(exp.exp, cint)
+        value = constant(exp.exp)
+        if value is None:
+            return exp
+        k = kind(exp)
+        if exp.op == 'not':
+            return literal(exp.type, not value) if k == 'bool' else exp
+        if k == 'float':
+            # codegen subtracts from 0.0, so -0.0 folds to 0.0
+            return literal(exp.type, to_f32(0.0 - value))
+        if k not in ('int', 'cint'):
+            return exp
+        if cint and value == INT_MIN:
+            self.warn('cint negation')
+            return exp
+        return literal(exp.type, wrap(-value))
+
+    def visit_BinOp(self, exp, cint):
+        exp.lhs = self.fold(exp.lhs, cint)
+        exp.rhs = self.fold(exp.rhs, cint)
+        lhs, rhs = constant(exp.lhs), constant(exp.rhs)
+        if lhs is None or rhs is None:
+            return exp
+        value = self.binop(exp.op, kind(exp.lhs), lhs, rhs, cint)
+        return exp if value is None else literal(exp.type, value)
+
+    def binop(self, op, k, lhs, rhs, cint):
+        ''' Value of a constant binop as codegen would compute it, or None '''
+        if op in LOGIC:
+            return LOGIC[op](lhs, rhs) if k == 'bool' else None
+        if k == 'float':
+            # in a cint context codegen would use integer instructions
+            if cint:
+                return None
+            if op in COMPARE:
+                return COMPARE[op](lhs, rhs)
+            if op == 'div':
+                return to_f32(lhs / rhs) if rhs != 0 else None
+            return to_f32(ARITH[op](lhs, rhs))
+        if k not in ('int', 'cint'):
+            return None
+        if op in COMPARE:
+            return COMPARE[op](lhs, rhs)
+        checked = cint or k == 'cint'
+        if op == 'div':
+            if rhs == 0 or (lhs == INT_MIN and rhs == -1):
+                if checked:
+                    self.warn('cint division')
+                return None
+            return sdiv(lhs, rhs)
+        value = ARITH[op](lhs, rhs)
+        if checked and not INT_MIN <= value <= INT_MAX:
+            self.warn('cint ' + op)
+            return None
+        return wrap(value)
+
+
+# main function
+def fold(ast):
+    return Folder(signatures(ast)).visit(ast)
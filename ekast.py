@@ -0,0 +1,216 @@
+import strings
+
+
+class Node:
+    '''
+    Base class of the ast nodes
+    name is the node tag used by -emit-ast and fields lists the attributes
+    in constructor order; unset fields are None and left out of to_dict
+    '''
+    __slots__ = ()
+    tag = strings.name
+    name = None
+    fields = ()
+
+    def __init__(self, *values):
+        for field in self.fields:
+            setattr(self, field, None)
+        for field, value in zip(self.fields, values):
+            setattr(self, field, value)
+
+    def to_dict(self):
+        ''' Return the node as the nested dicts written by -emit-ast '''
+        d = {self.tag: self.name}
+        for field in self.fields:
+            value = getattr(self, field)
+            if value is not None:
+                d[field] = to_plain(value)
+        return d
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+def to_plain(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    return value
+
+
+class Visitor:
+    '''
+    Base class of the ast passes
+    visit(node, ...) calls visit_<Class>(node, ...) for the class of node or
+    its closest base class, and generic_visit when there is none
+    '''
+    def __init__(self):
+        self.methods = {}
+
+    def visit(self, node, *args):
+        try:
+            method = self.methods[node.__class__]
+        except KeyError:
+            method = self.methods[node.__class__] = self.lookup(node.__class__)
+        return method(node, *args)
+
+    def lookup(self, cls):
+        for klass in cls.__mro__:
+            method = getattr(self, 'visit_' + klass.__name__, None)
+            if method is not None:
+                return method
+        return self.generic_visit
+
+    def generic_visit(self, node, *args):
+        raise RuntimeError('error: ast is not processed: ' + str(node))
+
+
+# program structure
+class Prog(Node):
+    __slots__ = ('funcs', 'externs', 'funcList')
+    name = strings.prog
+    fields = __slots__
+
+class Externs(Node):
+    __slots__ = ('externs',)
+    name = strings.externs
+    fields = __slots__
+
+class Funcs(Node):
+    __slots__ = ('funcs',)
+    name = strings.funcs
+    fields = __slots__
+
+class Extern(Node):
+    __slots__ = ('ret_type', 'globid', 'tdecls')
+    name = strings.extern
+    fields = __slots__
+
+class Func(Node):
+    __slots__ = ('ret_type', 'globid', 'vdecls', 'blk')
+    name = strings.func
+    fields = __slots__
+
+class Blk(Node):
+    __slots__ = ('contents',)
+    name = strings.blk
+    fields = __slots__
+
+class Stmts(Node):
+    __slots__ = ('stmts',)
+    name = strings.stmts
+    fields = __slots__
+
+class VDecls(Node):
+    __slots__ = ('vars',)
+    name = strings.vdecls
+    fields = __slots__
+
+class TDecls(Node):
+    __slots__ = ('types',)
+    name = strings.tdecls
+    fields = __slots__
+
+class VDecl(Node):
+    __slots__ = ('type', 'var')
+    tag = strings.node
+    name = strings.vdecl
+    fields = __slots__
+
+
+# statements
+class Stmt(Node):
+    __slots__ = ()
+
+class BlkStmt(Stmt):
+    __slots__ = ('contents',)
+    name = strings.blk
+    fields = __slots__
+
+class Ret(Stmt):
+    __slots__ = ('exp',)
+    name = strings.ret
+    fields = __slots__
+
+class VarDeclStmt(Stmt):
+    __slots__ = ('vdecl', 'exp')
+    name = strings.vardeclstmt
+    fields = __slots__
+
+class ExpStmt(Stmt):
+    __slots__ = ('exp',)
+    name = strings.expstmt
+    fields = __slots__
+
+class While(Stmt):
+    __slots__ = ('cond', 'stmt')
+    name = strings.whileStmt
+    fields = __slots__
+
+class If(Stmt):
+    __slots__ = ('cond', 'stmt', 'else_stmt')
+    name = strings.ifStmt
+    fields = __slots__
+
+class Print(Stmt):
+    __slots__ = ('exp',)
+    name = strings.printStmt
+    fields = __slots__
+
+class PrintSlit(Stmt):
+    __slots__ = ('string',)
+    name = strings.printSlit
+    fields = __slots__
+
+
+# expressions, type is filled in by the semantics checker
+class Exp(Node):
+    __slots__ = ()
+
+class Exps(Node):
+    __slots__ = ('exps',)
+    name = strings.exps
+    fields = __slots__
+
+class Lit(Exp):
+    __slots__ = ('type', 'value')
+    name = strings.litExp
+    fields = __slots__
+
+class FLit(Lit):
+    __slots__ = ()
+    name = strings.flitExp
+
+class VarVal(Exp):
+    __slots__ = ('var', 'type')
+    name = strings.varExp
+    fields = __slots__
+
+class FuncCall(Exp):
+    __slots__ = ('globid', 'params', 'type')
+    name = strings.funcCallExp
+    fields = __slots__
+
+class Assign(Exp):
+    __slots__ = ('var', 'exp', 'type')
+    name = strings.assign
+    fields = __slots__
+
+class Cast(Exp):
+    __slots__ = ('type', 'exp')
+    name = strings.caststmt
+    fields = __slots__
+
+# safe is set by the range analysis on cint arithmetic that cannot
+# overflow; it is not part of the emitted ast
+class BinOp(Exp):
+    __slots__ = ('lhs', 'op', 'rhs', 'type', 'safe')
+    name = strings.binop
+    fields = __slots__[:-1]
+
+class UOp(Exp):
+    __slots__ = ('op', 'exp', 'type', 'safe')
+    name = strings.uop
+    fields = __slots__[:-1]
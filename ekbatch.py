@@ -0,0 +1,101 @@
+import json
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import ekparser
+import utils
+import semanticsChecker
+import codegen
+import frontend
+import phases
+from ekserver import capture_stdout
+
+
+def read_manifest(path):
+    '''
+    Read a batch manifest: one source file per line followed by its program
+    arguments; blank lines and lines starting with # are skipped
+    Return a list of (source_file, sysarg)
+    '''
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            words = shlex.split(line, comments=True)
+            if words:
+                jobs.append((words[0], words[1:]))
+    return jobs
+
+def warm_up():
+    ''' Worker initializer: the parser tables load on import, llvm here '''
+    codegen.initialize_llvm()
+
+def compile_file(source_file, sysarg, jit, optimization, source_code=None):
+    '''
+    Run one file through parse, check, codegen and optional jit, timing
+    each phase in seconds; source_code, when given, is used instead of
+    reading source_file
+    Return the exit status (if jitted) and the timings
+    '''
+    timer = phases.PhaseTimer()
+    with timer.phase('read'):
+        if source_code is None:
+            source_code = utils.read_file(source_file)
+    with timer.phase('parse'):
+        ast = ekparser.getAst(source_code)
+    if not ast:
+        raise RuntimeError('error: no valid ast')
+    with timer.phase('check'):
+        semanticsChecker.check(ast)
+    module = frontend.lower(ast, optimization, timer)
+    status = None
+    if jit:
+        with timer.phase('optimize'):
+            parsed_module = codegen.prepare(module, optimization)
+        with timer.phase('run'):
+            status = codegen.run_module(parsed_module, sysarg)
+    return status, {p['phase']: p['wall'] for p in timer.phases}
+
+def try_compile(*job):
+    try:
+        return compile_file(*job), None
+    except Exception as err:
+        return (None, None), str(err)
+
+def run_job(job):
+    ''' Return the result dict of one compile_file(*job) job '''
+    start = time.perf_counter()
+    ((status, timings), error), output = capture_stdout(try_compile, *job)
+    result = {'file': job[0], 'status': 'ok' if error is None else 'error',
+              'exit': status, 'stdout': output}
+    if error is not None:
+        result['error'] = error
+    result['timings'] = dict(timings or {}, total=time.perf_counter() - start)
+    return result
+
+
+def run_batch(jobs, jit=False, optimization=False, workers=None, out=sys.stdout):
+    '''
+    Compile (source_file, sysarg) jobs on a pool of warm worker processes and
+    write one json line per file to out, in job order
+    A '-' job compiles stdin, which is read here once since the workers
+    cannot share it
+    Return the number of files that failed
+    '''
+    workers = workers or os.cpu_count() or 1
+    stdin = None
+    if any(source_file == utils.STDIN for source_file, _ in jobs):
+        stdin = utils.read_file(utils.STDIN)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1)),
+                             initializer=warm_up) as pool:
+        tasks = [(source_file, sysarg, jit, optimization,
+                  stdin if source_file == utils.STDIN else None)
+                 for source_file, sysarg in jobs]
+        for result in pool.map(run_job, tasks):
+            if result['status'] != 'ok':
+                failed += 1
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    return failed
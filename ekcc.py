@@ -1,9 +1,14 @@
 import argparse
+import os
 import sys
+import tempfile
 import ekparser
 import utils
 import semanticsChecker
 import codegen
+import frontend
+import phases
+import options
 
 def fuzztest(source_code):
     ast = ekparser.getAst(source_code)
@@ -12,46 +17,219 @@ def fuzztest(source_code):
         sys.exit(-1)
     semanticsChecker.check(ast)
 
+def compile(source_code, opt=False, inline_threshold=None, passes=()):
+    '''
+    Compile EK source code once to run it many times, the library side of
+    -jit; opt is an optimization level as codegen.pipeline takes it, e.g.
+    True for -O or '2' for -O2
+    Return a codegen.Program: run(args) returns the exit status of run for
+    each list of program arguments, one run at a time across threads,
+    close() frees the machine code
+    '''
+    optimization = codegen.pipeline(opt, inline_threshold, passes)
+    ast = ekparser.getAst(source_code)
+    if not ast:
+        raise RuntimeError('error: no valid ast')
+    semanticsChecker.check(ast)
+    module = frontend.lower(ast, optimization)
+    return codegen.Program(codegen.prepare(module, optimization, report=False))
+
+def given(**options):
+    '''
+    The options given on the command line, as keyword arguments, so the
+    defaults stay with the modules of each mode, imported only when used
+    '''
+    return {name: value for name, value in options.items() if value is not None}
+
+def print_timings(timer, time_format):
+    if timer is not None:
+        sys.stdout.flush()
+        print(timer.table() if time_format == 'table' else timer.to_json(), file=sys.stderr)
+
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('source_file', metavar='source_file', help='input file name')
+    parser.add_argument('source_file', metavar='source_file', nargs='?', help="input file name, '-' for stdin")
     parser.add_argument('-emit-ast', action='store_true', default=False,
                         dest='boolean_emit_ast', help='generate ast and save as yaml file')
     parser.add_argument('-emit-llvm', action='store_true', default=False,
                         dest='boolean_emit_llvm', help='generate ir')
+    parser.add_argument('-emit-obj', action='store_true', default=False,
+                        dest='boolean_emit_obj', help='save native object code')
+    parser.add_argument('-emit-asm', action='store_true', default=False,
+                        dest='boolean_emit_asm', help='save native assembly')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='link a standalone executable')
     parser.add_argument('-jit', action='store_true', default=False,
                         dest='boolean_jit', help='generate ast')
-    parser.add_argument('-O)', action='store_true', help='optimization mode',
-                        dest='optimization', required=False)
+    options.add_optimization_arguments(parser, codegen.PASSES)
+    parser.add_argument('-tiered', action='store_true', default=False,
+                        dest='boolean_tiered', help='with -jit, start unoptimized and '
+                        'optimize hot functions in the background')
+    parser.add_argument('-time-phases', action='store_true', default=False,
+                        dest='boolean_time_phases', help='report wall and cpu time per phase on stderr')
+    parser.add_argument('--time-format', choices=['table', 'json'], default='table',
+                        help='-time-phases report format')
+    parser.add_argument('-watch', action='store_true', default=False,
+                        dest='boolean_watch', help='rebuild (and with -jit rerun) on every '
+                        'change of source_file, keeping the compiler warm')
+    parser.add_argument('--watch-interval', type=float, default=None,
+                        help='seconds between -watch checks of the mtime, default 0.2')
+    parser.add_argument('--serve', action='store_true', default=False,
+                        help='keep a warm compiler listening on a unix socket')
+    parser.add_argument('--socket', default=None,
+                        help='socket path for --serve, default $TMPDIR/ekcc-<uid>.sock')
+    parser.add_argument('--batch', action='store_true', default=False,
+                        help='compile every listed source file on a process pool')
+    parser.add_argument('--manifest', help='with --batch, file listing sources and their args')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes for --batch (default one per cpu), or for '
+                             'optimizing and emitting the parts of a -jit program')
+    parser.add_argument('-cache', action='store_true', default=False,
+                        dest='boolean_cache', help='reuse cached machine code for -jit')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory of the -cache machine code cache, default '
+                             '$EKCC_CACHE_DIR or ~/.cache/ekcc')
+    parser.add_argument('-incremental', action='store_true', default=False,
+                        dest='boolean_incremental', help='with -jit, only check, generate and '
+                        'optimize the functions changed since the last build, caching in --cache-dir')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='size limit of the -cache directory in bytes, default 64 MiB')
     parser.add_argument('sysarg', nargs='*')
     args = parser.parse_args()
+    try:
+        args.optimization = codegen.pipeline(args.opt_level, args.inline_threshold,
+                                             options.pass_names(args.passes))
+    except RuntimeError as err:
+        parser.exit(2, '{}\n'.format(err))
+
+    cache_options = given(directory=args.cache_dir, max_size=args.cache_size)
+    if args.serve:
+        import ekserver
+        ekserver.serve(**given(path=args.socket))
+        sys.exit(0)
+    if args.batch:
+        # every positional is a source file; per-file args come from the manifest
+        import ekbatch
+        jobs = [(f, []) for f in [args.source_file] + args.sysarg if f is not None]
+        if args.manifest is not None:
+            jobs += ekbatch.read_manifest(args.manifest)
+        if not jobs:
+            parser.error('--batch needs source files or --manifest')
+        failed = ekbatch.run_batch(jobs, args.boolean_jit, args.optimization, args.jobs)
+        sys.exit(1 if failed else 0)
+    if args.source_file is None:
+        parser.error('the following arguments are required: source_file')
+    if args.boolean_incremental and (args.boolean_emit_ast or args.boolean_emit_llvm or
+                                     args.boolean_emit_obj or args.boolean_emit_asm or
+                                     args.output or not args.boolean_jit):
+        parser.error('-incremental only runs the program, with -jit')
+    if args.boolean_cache and args.boolean_jit:
+        # a cache hit runs the cached code whole, as it was compiled
+        for flag, used in [('-tiered', args.boolean_tiered), ('-j', args.jobs),
+                           ('-time-phases', args.boolean_time_phases),
+                           ('-incremental', args.boolean_incremental),
+                           ('-watch', args.boolean_watch)]:
+            if used:
+                parser.error('-cache cannot be combined with ' + flag)
+    if args.boolean_watch:
+        if args.source_file == utils.STDIN:
+            parser.error('-watch needs a source file')
+        import incremental
+        import ekwatch
+        cache = incremental.FunctionCache(**cache_options)
+        ekwatch.watch(args.source_file, args.sysarg, args.boolean_jit, args.optimization,
+                      cache, time_format=args.time_format, **given(interval=args.watch_interval))
+        sys.exit(0)
+
+    timer = phases.PhaseTimer() if args.boolean_time_phases else None
+    with phases.timed(timer, 'read'):
+        source_code = utils.read_file(args.source_file)
+
+    # a cache hit skips everything up to loading the object code
+    cache = None
+    if args.boolean_cache and args.boolean_jit:
+        import jitcache
+        cache = jitcache.ObjectCache(**cache_options)
+        key = jitcache.cache_key(source_code, args.optimization)
+        if not (args.boolean_emit_ast or args.boolean_emit_llvm or args.boolean_emit_obj or
+                args.boolean_emit_asm or args.output):
+            result = jitcache.execute_cached(cache, key, args.sysarg)
+            if result is not None:
+                print("\nexit: {}".format(result))
+                sys.exit(0)
 
     # generate ast
-    source_code = utils.read_file(args.source_file)
-    ast = ekparser.getAst(source_code)
+    if timer is not None:
+        with timer.phase('lex'):
+            tokens = ekparser.tokenize(source_code)
+        with timer.phase('parse'):
+            ast = ekparser.parseTokens(tokens)
+    else:
+        ast = ekparser.getAst(source_code)
 
     if not ast:
         raise RuntimeError('error: no valid ast')
+
+    # unchanged functions skip the checker, codegen and the passes
+    if args.boolean_incremental:
+        import incremental
+        cache = incremental.FunctionCache(**cache_options)
+        incremental.execute(ast, args.sysarg, args.optimization, cache, timer)
+        print_timings(timer, args.time_format)
+        sys.exit(0)
     
-    # check semantic errors
-    semanticsChecker.check(ast)
+    # check semantic errors, all checks run in one walk
+    with phases.timed(timer, 'check'):
+        semanticsChecker.check(ast)
 
     # save ast to file
     if args.boolean_emit_ast:
-        utils.emit_ast(args.source_file.rsplit('.', 1)[0] + '.ast.yaml', ast)
-    
-    # generate ir
-    module = codegen.generate_ir(ast, args.sysarg)
+        utils.emit_ast(utils.base_name(args.source_file) + '.ast.yaml', ast)
+
+    # generate ir, folded when optimizing; -tiered generates its own tiers
+    emit = (args.boolean_emit_llvm or args.boolean_emit_obj or args.boolean_emit_asm or
+            args.output)
+    if args.boolean_jit and args.boolean_tiered and not emit:
+        frontend.simplify(ast, args.optimization, timer)
+    else:
+        module = frontend.lower(ast, args.optimization, timer)
 
     # save ir to file
     if args.boolean_emit_llvm:
-        utils.emit_ir(args.source_file.rsplit('.', 1)[0] + '.ll', module)
+        utils.emit_ir(utils.base_name(args.source_file) + '.ll', module)
     
+    # native code, getarg and getargf read the executable's arguments
+    if args.boolean_emit_obj or args.boolean_emit_asm or args.output:
+        import aot
+        base = utils.base_name(args.source_file)
+        parsed_module = codegen.prepare(module, args.optimization)
+        if args.boolean_emit_asm:
+            aot.emit_asm(base + '.s', parsed_module)
+        if args.boolean_emit_obj:
+            aot.emit_obj(base + '.o', parsed_module)
+        if args.output:
+            with tempfile.TemporaryDirectory() as tmp:
+                obj = os.path.join(tmp, 'prog.o')
+                aot.emit_obj(obj, parsed_module)
+                aot.link(args.output, obj)
+
     # jit compiler
-    if args.boolean_jit:
-        module = codegen.execute(module, args.optimization)
+    if cache is not None:
+        result = jitcache.execute(module, args.optimization, cache, key, args.sysarg)
+        print("\nexit: {}".format(result))
+    elif args.boolean_jit and args.boolean_tiered:
+        import tiered
+        # hot functions are optimized at the -O level, -O3 when none is given
+        hot = args.optimization or codegen.pipeline('3', args.inline_threshold)
+        tiered.execute(ast, args.sysarg, hot, timer)
+    elif args.boolean_jit and args.jobs:
+        import ekparallel
+        ekparallel.execute(module, args.optimization, args.jobs, args.sysarg, timer)
+    elif args.boolean_jit:
+        module = codegen.execute(module, args.optimization, args.sysarg, timer)
 
+    print_timings(timer, args.time_format)
     sys.exit(0)
 
 if __name__== "__main__":
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import options
+
+# kept free of compiler imports, options aside, so the client starts
+# without llvmlite/ply/yaml
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'ekcc-{}.sock'.format(os.getuid()))
+
+
+def send(request, path=DEFAULT_SOCKET):
+    '''
+    Send a request dict to a running `ekcc --serve`
+    Return the response dict
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode('utf8'))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks).decode('utf8'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source_file', metavar='source_file', help="input file name, '-' for stdin")
+    parser.add_argument('-emit-llvm', action='store_true', default=False,
+                        dest='boolean_emit_llvm', help='generate ir')
+    parser.add_argument('-jit', action='store_true', default=False,
+                        dest='boolean_jit', help='execute the source code')
+    options.add_optimization_arguments(parser)
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='server socket path')
+    parser.add_argument('sysarg', nargs='*')
+    args = parser.parse_args()
+
+    if args.source_file == '-':
+        source_code = sys.stdin.read()
+        base = 'stdin'
+    else:
+        with open(args.source_file) as f:
+            source_code = f.read()
+        base = args.source_file.rsplit('.', 1)[0]
+
+    response = send({
+        'source': source_code,
+        'emit_llvm': args.boolean_emit_llvm,
+        'jit': args.boolean_jit,
+        'optimization': args.opt_level,
+        'inline_threshold': args.inline_threshold,
+        'passes': options.pass_names(args.passes),
+        'sysarg': args.sysarg,
+    }, args.socket)
+
+    sys.stdout.write(response['stdout'])
+    if not response['ok']:
+        print(response['error'], file=sys.stderr)
+        sys.exit(1)
+
+    if response['ir'] is not None:
+        with open(base + '.ll', 'w') as f:
+            f.write(response['ir'])
+    if response['exit'] is not None:
+        print("\nexit: {}".format(response['exit']))
+    sys.exit(0)
+
+if __name__== "__main__":
+    main()
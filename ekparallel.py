@@ -0,0 +1,163 @@
+from ctypes import CFUNCTYPE, c_int
+from concurrent.futures import ProcessPoolExecutor
+from llvmlite import ir
+import llvmlite.binding as llvm
+import codegen
+from phases import timed
+
+# callees up to this many instructions are inlining candidates under -O and
+# are kept in the same part as their callers
+INLINE_SIZE = 40
+
+
+def function_size(func):
+    return sum(len(block.instructions) for block in func.blocks)
+
+def callees(func):
+    for block in func.blocks:
+        for instr in block.instructions:
+            if isinstance(instr, ir.CallInstr) and isinstance(instr.callee, ir.Function):
+                yield instr.callee
+
+def group(names, sizes, calls, optimization):
+    '''
+    Group function names so that no call that the inliner could take
+    crosses a group; sizes and calls map each name to its instruction count
+    and the names it calls. Without optimization every function is its own
+    group
+    Return the groups as lists of names in the order of names
+    '''
+    parent = {name: name for name in names}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    if optimization:
+        for name in names:
+            for callee in calls[name]:
+                if callee in sizes and sizes[callee] <= INLINE_SIZE:
+                    parent[find(callee)] = find(name)
+
+    groups = {}
+    for name in names:
+        groups.setdefault(find(name), []).append(name)
+    return list(groups.values())
+
+def clusters(module, optimization):
+    '''
+    group the defined functions of module
+    Return the groups as lists of functions in definition order
+    '''
+    funcs = {f.name: f for f in module.functions if shared(f)}
+    sizes = {name: function_size(f) for name, f in funcs.items()}
+    calls = {name: [callee.name for callee in callees(f)] for name, f in funcs.items()}
+    return [[funcs[name] for name in names]
+            for names in group(list(funcs), sizes, calls, optimization)]
+
+def partition(module, optimization, workers):
+    '''
+    Pack the clusters of module into at most workers parts of similar
+    instruction count, largest cluster first; ties keep definition order
+    Return the parts as sets of function names
+    '''
+    groups = clusters(module, optimization)
+    weighted = sorted(enumerate(groups),
+                      key=lambda g: (-sum(function_size(f) for f in g[1]), g[0]))
+    parts = [[0, set()] for _ in range(min(workers, len(groups)))]
+    for _, group in weighted:
+        part = min(parts, key=lambda p: p[0])
+        part[0] += sum(function_size(f) for f in group)
+        part[1].update(f.name for f in group)
+    return [names for _, names in parts]
+
+def shared(func):
+    ''' Whether func is defined in one part and declared in the others '''
+    return not func.is_declaration and func.linkage != 'internal'
+
+def declaration(func):
+    buf = []
+    func.descr_prototype(buf)
+    return 'declare' + ''.join(buf)[len('define'):]
+
+def part_ir(module, names):
+    '''
+    Ir text of module with only the functions in names defined; the other
+    functions become declarations resolved against the other parts, except
+    internal ones, which every part gets a copy of, like the metadata
+    '''
+    lines = ['target triple = "{}"'.format(module.triple),
+             'target datalayout = "{}"'.format(module.data_layout), '']
+    for value in module.global_values:
+        if isinstance(value, ir.Function) and shared(value) and value.name not in names:
+            lines.append(declaration(value))
+        else:
+            lines.append(str(value))
+    lines += [str(metadata) for metadata in module.metadata]
+    return '\n'.join(lines) + '\n'
+
+
+def compile_part(text, optimization):
+    '''
+    Optimize one part and emit its object code
+    Return the object code and whether the passes modified the part
+    '''
+    codegen.initialize_llvm()
+    parsed_module = llvm.parse_assembly(text)
+    is_modified = codegen.optimize(parsed_module, optimization) if optimization else False
+    parsed_module.verify()
+    target_machine = llvm.Target.from_default_triple().create_target_machine()
+    return target_machine.emit_object(parsed_module), is_modified
+
+def run_objects(objects, args=()):
+    '''
+    Load the object code of every part into one MCJIT engine and call run
+    with the program arguments args; the engine is freed after
+    Return the exit status of run
+    '''
+    target_machine = llvm.Target.from_default_triple().create_target_machine()
+    engine = llvm.create_mcjit_compiler(llvm.parse_assembly(''), target_machine)
+    try:
+        for obj in objects:
+            engine.add_object_file(llvm.ObjectFileRef.from_data(obj))
+        engine.finalize_object()
+        entry = engine.get_function_address("run")
+        cfunc = CFUNCTYPE(c_int)(entry)
+        with codegen.arg_lock:
+            codegen.set_args(args)
+            return cfunc()
+    finally:
+        engine.close()
+
+def jit(module, optimization, workers, args=(), timer=None):
+    '''
+    codegen.jit with the passes and object emission of each part running in
+    its own process
+    Falls back to whole-module mode when the program does not split into
+    at least two parts, so the result only depends on module and workers
+    Return the exit status of run
+    '''
+    optimization = codegen.pipeline(optimization)
+    with timed(timer, 'partition'):
+        parts = partition(module, optimization, workers) if workers > 1 else []
+        texts = [part_ir(module, names) for names in parts] if len(parts) > 1 else []
+    if not texts:
+        return codegen.jit(module, optimization, args, timer)[1]
+
+    # the parts are optimized and emitted in the workers, not timed per pass
+    with timed(timer, 'optimize'):
+        with ProcessPoolExecutor(max_workers=len(texts), initializer=codegen.initialize_llvm) as pool:
+            results = list(pool.map(compile_part, texts, [optimization] * len(texts)))
+
+    if optimization:
+        # check if the optimizations made any modification to the module
+        print("Optimizations made modification to the module: ",
+              any(is_modified for _, is_modified in results))
+    with timed(timer, 'run'):
+        return run_objects([obj for obj, _ in results], args)
+
+def execute(module, optimization, workers, args=(), timer=None):
+    result = jit(module, optimization, workers, args, timer)
+    print("\nexit: {}".format(result))
@@ -1,7 +1,16 @@
+import os
+import sys
 import ply.yacc as yacc
+import ekast
 from strings import *
+import eklexer
 from eklexer import tokens
 
+# Parser tables are generated once (python ekparser.py) next to this module
+# and only read afterwards, so compiling never writes to the cwd
+TABMODULE = 'ekparsetab'
+OUTPUTDIR = os.path.dirname(os.path.abspath(__file__))
+
 precedence = (
   ('nonassoc', 'IF'),
   ('nonassoc', 'ELSE'),
@@ -20,31 +29,29 @@ def p_prog(p):
   '''prog : funcs
           | externs funcs'''
   if len(p) == 2:
-    p[0] = {name: prog, funcs: p[1]}
+    p[0] = ekast.Prog(p[1])
   else:
-    p[0] = {name: prog, funcs: p[2], externs: p[1]}
+    p[0] = ekast.Prog(p[2], p[1])
 
 
 # <externs> ::= ​<extern>​+
 def p_externs(p):
   '''externs : extern
-             | extern externs'''
+             | externs extern'''
   if len(p) == 2:
-    p[0] = {name: externs, externs:[p[1]]}
+    p[0] = ekast.Externs([p[1]])
   else:
-    appendToHead(p[2], externs, p[1])
-    p[0] = p[2]
+    p[0] = appendToTail(p[1], externs, p[2])
 
 
 # <funcs> ::= ​<func>​+
 def p_funcs(p):
   '''funcs : func
-           | func funcs'''
+           | funcs func'''
   if len(p) == 2:
-    p[0] = {name: funcs, funcs:[p[1]]}
+    p[0] = ekast.Funcs([p[1]])
   else:
-    appendToHead(p[2], funcs, p[1])
-    p[0] = p[2]
+    p[0] = appendToTail(p[1], funcs, p[2])
 
 
 # <extern> ::= extern ​<type>​ ​<globid>​ "(" ​<tdecls>​? ")" ";"
@@ -52,9 +59,9 @@ def p_extern(p):
   '''extern : EXTERN TYPE globid LPAREN RPAREN SEMICOLON
             | EXTERN TYPE globid LPAREN tdecls RPAREN SEMICOLON'''
   if len(p) == 7:
-    p[0] = {name: extern, ret_type: p[2], globid:p[3]}
+    p[0] = ekast.Extern(p[2], p[3])
   else:
-    p[0] = {name: extern, ret_type: p[2], globid:p[3], tdecls: p[5]}
+    p[0] = ekast.Extern(p[2], p[3], p[5])
 
 
 # <func> ::= def ​<type>​ ​<globid>​ "(" ​<vdecls>​? ")" ​<blk> ::= "{" ​<stmts>​? "}"
@@ -62,9 +69,9 @@ def p_func(p):
   '''func : DEF TYPE globid LPAREN RPAREN blk
           | DEF TYPE globid LPAREN vdecls RPAREN blk'''
   if len(p) == 7:
-    p[0] = {name: func, ret_type: p[2], globid: p[3], blk: p[6]}
+    p[0] = ekast.Func(p[2], p[3], None, p[6])
   else:
-    p[0] = {name: func, ret_type: p[2], globid: p[3], vdecls: p[5], blk:p[7]}
+    p[0] = ekast.Func(p[2], p[3], p[5], p[7])
 
 
 # <blk> ::= "{" ​<stmts>​? "}"
@@ -72,20 +79,19 @@ def p_blk(p):
   '''blk : LBRACE RBRACE
          | LBRACE stmts RBRACE'''
   if len(p) == 3:
-    p[0] = {name: blk}
+    p[0] = ekast.Blk()
   else:
-    p[0] = {name: blk, contents: p[2]}
+    p[0] = ekast.Blk(p[2])
 
 
 # <stmts> ::= ​<stmt>​+
 def p_statements(p):
   '''stmts : stmt
-           | stmt stmts'''
+           | stmts stmt'''
   if len(p) == 2:
-    p[0] = {name: stmts, stmts: [p[1]]}
+    p[0] = ekast.Stmts([p[1]])
   else :
-    appendToHead(p[2], stmts, p[1])
-    p[0] = p[2]
+    p[0] = appendToTail(p[1], stmts, p[2])
 
 
 # stmt ::= ​<blk>
@@ -98,54 +104,53 @@ def p_statements(p):
 #       | print ​<slit>​ ";"
 def p_blkStmt(p):
   '''stmt : blk'''
-  p[0] = {name: blk, contents: p[1]}
+  p[0] = ekast.BlkStmt(p[1])
 
 def p_return(p):
   '''stmt : RETURN SEMICOLON
           | RETURN exp SEMICOLON'''
   if len(p) == 4:
-    p[0] = {name: ret, exp: p[2]}
+    p[0] = ekast.Ret(p[2])
   else:
-    p[0] = {name: ret}
+    p[0] = ekast.Ret()
 
 def p_vdeclStmt(p):
   '''stmt : vdecl ASSIGN exp SEMICOLON'''
-  p[0] = {name: vardeclstmt, vdecl: p[1], exp: p[3]}
+  p[0] = ekast.VarDeclStmt(p[1], p[3])
 
 def p_expSemi(p):
   '''stmt : exp SEMICOLON'''
-  p[0] = {name: expstmt, exp: p[1]}
+  p[0] = ekast.ExpStmt(p[1])
 
 def p_while(p):
    '''stmt : WHILE LPAREN exp RPAREN stmt'''
-   p[0] = {name: whileStmt, cond: p[3], stmt: p[5]}
+   p[0] = ekast.While(p[3], p[5])
 
 def p_if(p):
   '''stmt : IF LPAREN exp RPAREN stmt %prec IF
           | IF LPAREN exp RPAREN stmt ELSE stmt'''
   if len(p) == 6:
-    p[0] = {name: ifStmt, cond: p[3], stmt: p[5]}
+    p[0] = ekast.If(p[3], p[5])
   else:
-    p[0] = {name: ifStmt, cond: p[3], stmt: p[5], else_stmt: p[7]}
+    p[0] = ekast.If(p[3], p[5], p[7])
 
 def p_printExp(p):
   '''stmt : PRINT exp SEMICOLON'''
-  p[0] = {name : printStmt, exp : p[2]}
+  p[0] = ekast.Print(p[2])
 
 def p_printSlit(p):
   '''stmt : PRINT slit SEMICOLON'''
-  p[0] = {name: "printslit", string: p[2]}
+  p[0] = ekast.PrintSlit(p[2])
 
 
 # <exps> ::= ​<exp>​ | ​<exp>​ "," ​<exps>
 def p_exps(p):
   ''' exps : exp
-           | exp COMMA exps'''
+           | exps COMMA exp'''
   if len(p) == 2:
-    p[0] = {name: "exps", exps: [p[1]]}
+    p[0] = ekast.Exps([p[1]])
   else:
-    appendToHead(p[3], exps, p[1])
-    p[0] = p[3]
+    p[0] = appendToTail(p[1], exps, p[3])
 
 
 # <exp> ::= "(" ​<exp>​ ")"
@@ -166,23 +171,23 @@ def p_expBinOpUop(p):
 def p_expLit(p):
   '''exp : lit'''
   if 'false' in str(p[1]) or 'true' in str(p[1]):
-    p[0] = {name: "lit", typ: 'bool', value: p[1]}
+    p[0] = ekast.Lit('bool', p[1])
   elif '.' in str(p[1]):
-    p[0] = {name: "flit", typ: 'float', value: p[1]}
+    p[0] = ekast.FLit('float', p[1])
   else:
-    p[0] = {name: "lit", typ: 'int', value: p[1]}
+    p[0] = ekast.Lit('int', p[1])
 
 def p_expVarid(p):
   '''exp : varid'''
-  p[0] = {name: varExp, var: p[1]}
+  p[0] = ekast.VarVal(p[1])
 
 def p_expGlobid(p):
   '''exp : globid LPAREN RPAREN
          | globid LPAREN exps RPAREN'''
   if len(p) == 4:
-    p[0] = {name: funcCallExp, globid: p[1]}
+    p[0] = ekast.FuncCall(p[1])
   else:
-    p[0] = {name: funcCallExp, globid: p[1], params: p[3]}
+    p[0] = ekast.FuncCall(p[1], p[3])
 
 
 # <binop> ::= <arith-ops>
@@ -197,9 +202,9 @@ def p_binop(p):
   if len(p) == 2:
     p[0] = p[1]
   elif len(p) == 4:
-    p[0] = {"name": assign, "var": p[1], "exp": p[3]}
+    p[0] = ekast.Assign(p[1], p[3])
   else:
-    p[0] = {"name": caststmt, "type": p[2], "exp": p[4]}
+    p[0] = ekast.Cast(p[2], p[4])
 
 
 # <arith-ops> ::= ​<exp>​ * ​<exp>
@@ -212,13 +217,13 @@ def p_arithOps(p):
               | exp PLUS exp
               | exp MINUS exp'''
   if p[2] == '*':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'mul', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'mul', p[3])
   elif p[2] == '/':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'div', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'div', p[3])
   elif p[2] == '+':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'add', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'add', p[3])
   else:
-    p[0] = {"name": binop, "lhs": p[1], "op": 'sub', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'sub', p[3])
 
 
 # <logic-ops> ::= ​<exp>​ == ​<exp>​  # equality
@@ -233,15 +238,15 @@ def p_logicOps(p):
               | exp AND exp
               | exp OR exp'''
   if p[2] == '==':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'eq', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'eq', p[3])
   elif p[2] == '<':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'lt', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'lt', p[3])
   elif p[2] == '>':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'gt', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'gt', p[3])
   elif p[2] == '&&':
-    p[0] = {"name": binop, "lhs": p[1], "op": 'and', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'and', p[3])
   else:
-    p[0] = {"name": binop, "lhs": p[1], "op": 'or', "rhs": p[3]}
+    p[0] = ekast.BinOp(p[1], 'or', p[3])
 
 
 # <uop> ::= ! ​<exp>​  # bitwise negation on bools
@@ -250,9 +255,9 @@ def p_uop(p):
   '''uop : MINUS exp %prec UOP
          | NOT exp %prec UOP'''
   if p[1] == "-":
-    p[0] = {"name" : uop, op: "minus", "exp": p[2] }
+    p[0] = ekast.UOp("minus", p[2])
   else:
-    p[0] = {"name" : uop, op: "not", "exp": p[2]}
+    p[0] = ekast.UOp("not", p[2])
 
 
 # <lit> ::= true 
@@ -308,29 +313,27 @@ def p_type(p):
 # <vdecls> ::= ​<vdecl>​ | ​<vdecl>​ "," ​<vdecls>
 def p_vdecls(p):
   '''vdecls : vdecl
-            | vdecl COMMA vdecls'''
+            | vdecls COMMA vdecl'''
   if len(p) == 2:
-    p[0] = {name: vdecls, vars: [p[1]]}
+    p[0] = ekast.VDecls([p[1]])
   else:
-    appendToHead(p[3], vars, p[1])
-    p[0] = p[3]
+    p[0] = appendToTail(p[1], vars, p[3])
 
 
 # <tdecls> ::= ​<type>​ | ​<type>​ "," ​<tdecls>
 def p_tdecls(p):
   '''tdecls : TYPE
-            | TYPE COMMA tdecls'''
+            | tdecls COMMA TYPE'''
   if len(p) == 2:
-    p[0] = {name: tdecls, 'types': [p[1]]}
+    p[0] = ekast.TDecls([p[1]])
   else :
-    appendToHead(p[3], 'types', p[1])
-    p[0] = p[3]
+    p[0] = appendToTail(p[1], 'types', p[3])
 
 
 # <vdecl> ::= ​<type>​ ​<varid>
 def p_vdecl(p):
   '''vdecl : TYPE varid'''
-  p[0] = {node: vdecl, typ: p[1], var: p[2]}
+  p[0] = ekast.VDecl(p[1], p[2])
 
 
 # Error
@@ -339,13 +342,48 @@ def p_error(p):
 
 
 # Helper functions
-def appendToHead(dic, key, value):
-  ''' append value to the head of dic[key] '''
-  dic[key].insert(0, value)
-  return dic
+# the list rules are left recursive, so elements arrive in source order and
+# the parser stack stays flat however long the list is
+def appendToTail(node, key, value):
+  ''' append value to the list node.key '''
+  getattr(node, key).append(value)
+  return node
+
+def buildParser(write_tables=False):
+  ''' Build the LALR parser, reusing the pregenerated tables if present '''
+  # never optimize: it skips the grammar signature check and would load
+  # stale tables; without write_tables stale ones are rebuilt in memory
+  return yacc.yacc(module=sys.modules[__name__], optimize=False,
+                   debug=False, write_tables=write_tables,
+                   tabmodule=TABMODULE, outputdir=OUTPUTDIR)
+
+parser = buildParser()
 
 def getAst(code):
-  ''' Build the parser and generate ast '''
-  yacc.yacc()
-  ast = yacc.parse(code, debug=False)
+  ''' Generate ast with the shared parser and a lexer of its own '''
+  ast = parser.parse(code, lexer=eklexer.Lexer(), debug=False)
   return ast
+
+class TokenStream:
+  ''' Replay a list of tokens through the lexer interface yacc uses '''
+  def __init__(self, tokens):
+    self.tokens = iter(tokens)
+
+  def input(self, data):
+    pass
+
+  def token(self):
+    return next(self.tokens, None)
+
+def tokenize(code):
+  ''' Lex all of code up front, so lexing and parsing can be timed apart '''
+  return eklexer.tokenize(code)
+
+def parseTokens(tokens):
+  ''' Generate ast from the tokens returned by tokenize '''
+  return parser.parse(lexer=TokenStream(tokens), debug=False)
+
+
+if __name__ == '__main__':
+  # install step: regenerate the parser tables into OUTPUTDIR
+  buildParser(write_tables=True)
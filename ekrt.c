@@ -0,0 +1,42 @@
+/*
+ * Runtime linked into executables built with ekcc -o: the argument buffer
+ * getarg/getargf read and the exit status of run. printf is libc's.
+ */
+#include <limits.h>
+#include <stdlib.h>
+
+int run(void);
+
+int ek_argc;
+int *ek_argi;
+float *ek_argf;
+
+/* strtod clamped to the int range, NaN as 0; codegen.arg_int matches it */
+static int to_int(const char *text)
+{
+    double value = strtod(text, NULL);
+
+    if (value != value)
+        return 0;
+    if (value >= INT_MAX)
+        return INT_MAX;
+    if (value <= INT_MIN)
+        return INT_MIN;
+    return (int) value;
+}
+
+int main(int argc, char **argv)
+{
+    int i;
+
+    ek_argc = argc - 1;
+    ek_argi = malloc((argc > 1 ? argc - 1 : 1) * sizeof *ek_argi);
+    ek_argf = malloc((argc > 1 ? argc - 1 : 1) * sizeof *ek_argf);
+    if (ek_argi == NULL || ek_argf == NULL)
+        return 1;
+    for (i = 0; i < ek_argc; i++) {
+        ek_argi[i] = to_int(argv[i + 1]);
+        ek_argf[i] = strtof(argv[i + 1], NULL);
+    }
+    return run();
+}
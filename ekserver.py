@@ -0,0 +1,107 @@
+import ctypes
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import ekparser
+import semanticsChecker
+import codegen
+import frontend
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'ekcc-{}.sock'.format(os.getuid()))
+
+# jitted code prints through the C stdio buffer, not sys.stdout
+libc = ctypes.CDLL(None)
+
+
+def flush_stdout():
+    sys.stdout.flush()
+    libc.fflush(None)
+
+def capture_stdout(fn, *args):
+    '''
+    Call fn with fd 1 redirected to a temporary file
+    Return the result of fn and everything written to stdout
+    '''
+    flush_stdout()
+    saved = os.dup(1)
+    with tempfile.TemporaryFile() as tmp:
+        os.dup2(tmp.fileno(), 1)
+        try:
+            result = fn(*args)
+        finally:
+            flush_stdout()
+            os.dup2(saved, 1)
+            os.close(saved)
+        tmp.seek(0)
+        output = tmp.read().decode('utf8', 'replace')
+    return result, output
+
+def compile_request(request):
+    '''
+    Run one request through parse, check, codegen and optional jit
+    Return the ir text (if asked for) and the exit status (if jitted)
+    '''
+    ast = ekparser.getAst(request['source'])
+    if not ast:
+        raise RuntimeError('error: no valid ast')
+    optimization = codegen.pipeline(request.get('optimization', False),
+                                    request.get('inline_threshold'), request.get('passes', ()))
+    semanticsChecker.check(ast)
+    module = frontend.lower(ast, optimization)
+
+    ir = str(module) if request.get('emit_llvm') else None
+    status = None
+    if request.get('jit'):
+        _, status = codegen.jit(module, optimization, request.get('sysarg', []))
+    return ir, status
+
+def try_compile(request):
+    try:
+        return compile_request(request), None
+    except Exception as err:
+        return (None, None), str(err)
+
+def handle(request):
+    ''' Return the response dict for a request dict '''
+    ((ir, status), error), output = capture_stdout(try_compile, request)
+    if error is not None:
+        return {'ok': False, 'error': error, 'stdout': output}
+    return {'ok': True, 'ir': ir, 'exit': status, 'stdout': output}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''
+    One json request per connection, read until the client shuts down
+    its write side; one json response is sent back
+    '''
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.read().decode('utf8'))
+        except ValueError as err:
+            response = {'ok': False, 'error': 'error: bad request: ' + str(err), 'stdout': ''}
+        else:
+            response = handle(request)
+        self.wfile.write(json.dumps(response).encode('utf8'))
+
+
+def serve(path=DEFAULT_SOCKET):
+    '''
+    Warm up the compiler and serve requests on a unix socket until interrupted
+    Requests are handled one at a time: the lexer, parser and the stdout
+    redirection are process wide
+    '''
+    codegen.initialize_llvm()
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.UnixStreamServer(path, RequestHandler)
+    print('ekcc: serving on {}'.format(path))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
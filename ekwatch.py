@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import ekparser
+import utils
+import semanticsChecker
+import codegen
+import incremental
+import frontend
+import phases
+from ekserver import flush_stdout
+
+DEFAULT_INTERVAL = 0.2
+
+
+def stamp(path):
+    ''' (mtime, size) of path, or None while it is missing, e.g. mid-save '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def build(source_file, sysarg, jit, optimization, cache):
+    '''
+    One pass of the pipeline on source_file; with jit unchanged functions
+    come from cache through incremental.execute
+    Return the phase timer
+    '''
+    timer = phases.PhaseTimer()
+    with timer.phase('read'):
+        source_code = utils.read_file(source_file)
+    with timer.phase('lex'):
+        tokens = ekparser.tokenize(source_code)
+    with timer.phase('parse'):
+        ast = ekparser.parseTokens(tokens)
+    if not ast:
+        raise RuntimeError('error: no valid ast')
+    if jit:
+        incremental.execute(ast, sysarg, optimization, cache, timer)
+    else:
+        with timer.phase('check'):
+            semanticsChecker.check(ast)
+        frontend.lower(ast, optimization, timer)
+    return timer
+
+def watch(source_file, sysarg, jit, optimization, cache, interval=DEFAULT_INTERVAL,
+          time_format='table'):
+    '''
+    Build source_file, then poll its mtime and build again after every
+    change, in this process so the parser tables, llvm and cache stay warm
+    Diagnostics and timings go to stderr; runs until interrupted
+    '''
+    codegen.initialize_llvm()
+    last = None
+    try:
+        while True:
+            current = stamp(source_file)
+            if current is None or current == last:
+                time.sleep(interval)
+                continue
+            last = current
+            print('--- {} {}'.format(source_file, time.strftime('%H:%M:%S')), file=sys.stderr)
+            try:
+                timer = build(source_file, sysarg, jit, optimization, cache)
+            except Exception as err:
+                flush_stdout()
+                print(err, file=sys.stderr)
+                continue
+            flush_stdout()
+            print(timer.table() if time_format == 'table' else timer.to_json(), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
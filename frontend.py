@@ -0,0 +1,22 @@
+import codegen
+import constfold
+import ranges
+from phases import timed
+
+
+def simplify(ast, optimization, timer=None):
+    '''
+    When optimizing, fold the constants of a checked ast and drop the cint
+    checks that cannot fail, so -O0 ir follows the source
+    '''
+    if codegen.pipeline(optimization):
+        with timed(timer, 'fold'):
+            constfold.fold(ast)
+        with timed(timer, 'ranges'):
+            ranges.analyze(ast)
+
+def lower(ast, optimization, timer=None):
+    ''' Generate the ir module of a checked ast, simplified first '''
+    simplify(ast, optimization, timer)
+    with timed(timer, 'generate_ir'):
+        return codegen.generate_ir(ast)
@@ -0,0 +1,248 @@
+import hashlib
+import os
+import pickle
+import llvmlite.binding as llvm
+import ekast
+import semanticsChecker
+import codegen
+import ekparallel
+import jitcache
+import constfold
+import ranges
+from phases import timed
+
+# getarg and getargf are generated by codegen, from their name alone
+BUILTINS = ['getarg', 'getargf']
+
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode('utf8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def calls(node, found=None):
+    ''' Names of the functions called anywhere below node '''
+    found = set() if found is None else found
+    if isinstance(node, list):
+        for value in node:
+            calls(value, found)
+    elif isinstance(node, ekast.Node):
+        if isinstance(node, ekast.FuncCall):
+            found.add(node.globid)
+        for field in node.fields:
+            calls(getattr(node, field), found)
+    return found
+
+def signature(decl):
+    ''' (return type, parameter types) of a Func or an Extern '''
+    if isinstance(decl, ekast.Func):
+        params = [vdecl.type for vdecl in decl.vdecls.vars] if decl.vdecls is not None else []
+    else:
+        params = list(decl.tdecls.types) if decl.tdecls is not None else []
+    return decl.ret_type, tuple(params)
+
+def fingerprints(ast, folded=False):
+    '''
+    Fingerprint every function defined in the module of ast: its ast, the
+    signatures of the functions it calls as declared before it, whether
+    constants are folded and the compiler version; getarg and getargf by
+    their signature
+    Must run before the checker, which adds types to the ast
+    Return {name: fingerprint}
+    '''
+    version = jitcache.compiler_version()
+    declared = {}
+    prints = {}
+    if ast.externs is not None:
+        for extern in ast.externs.externs:
+            declared[extern.globid] = signature(extern)
+            if extern.globid in BUILTINS:
+                prints[extern.globid] = digest(extern.globid, declared[extern.globid], version)
+    for func in ast.funcs.funcs:
+        declared[func.globid] = signature(func)
+        deps = sorted((name, declared.get(name)) for name in calls(func))
+        prints[func.globid] = digest(func.to_dict(), deps, folded, version)
+    return prints
+
+
+class FunctionCache:
+    '''
+    On-disk cache of pickled entries under <directory>/functions: a
+    <fingerprint>.func per checked function and a <key>.part per compiled
+    group of functions. mtime is the LRU clock and the total size is kept
+    under max_size
+    '''
+    def __init__(self, directory=jitcache.DEFAULT_DIR, max_size=jitcache.DEFAULT_MAX_SIZE):
+        self.directory = os.path.join(directory, 'functions')
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def lookup(self, name):
+        ''' Return the entry stored as name, or None on a miss '''
+        try:
+            with open(self.path(name), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            # evicted by another build meanwhile; the entry is read
+            pass
+        return entry
+
+    def store(self, name, entry):
+        # builds may share the directory: each write has its own temp file
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        jitcache.write_file(self.directory, self.path(name), data)
+
+    def evict(self):
+        ''' Drop least recently used entries until the cache fits max_size '''
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                size = os.path.getsize(self.path(name))
+                used = os.path.getmtime(self.path(name))
+            except OSError:
+                continue
+            entries.append((used, size, name))
+            total += size
+        entries.sort()
+        for used, size, name in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(self.path(name))
+            except OSError:
+                pass
+            total -= size
+
+
+class Analyzer(semanticsChecker.Analyzer):
+    ''' The checker, only declaring the functions in checked '''
+    def __init__(self, checked):
+        super().__init__()
+        self.checked = checked
+
+    def visit_Func(self, func):
+        if func in self.checked:
+            self.declare(func)
+        else:
+            super().visit_Func(func)
+
+
+def check(ast, prints, cache):
+    '''
+    Swap the functions of ast that have a cache entry for their checked
+    ast, then check the others
+    Return {name: cache entry} of the swapped functions
+    '''
+    entries = {}
+    funcs = ast.funcs.funcs
+    for index, func in enumerate(funcs):
+        entry = cache.lookup(prints[func.globid] + '.func')
+        if entry is not None:
+            funcs[index] = entry['func']
+            entries[func.globid] = entry
+    Analyzer({entry['func'] for entry in entries.values()}).visit(ast)
+    return entries
+
+def part_key(names, prints, optimization):
+    ''' Hash of everything the object code of a group depends on '''
+    return digest(sorted(prints[name] for name in names), optimization,
+                  llvm.get_default_triple(), llvm.get_host_cpu_name(),
+                  llvm.get_host_cpu_features().flatten())
+
+def build(ast, optimization, cache, timer=None):
+    '''
+    Compile a parsed program to object code, one object per group of
+    functions the inliner may merge (ekparallel.group). Only functions
+    with a new fingerprint are checked and generated, and only groups with
+    such a function, or whose members now inline differently, are optimized
+    and emitted; the rest comes from cache
+    Return the object code of every group and whether the passes modified
+    any of them
+    '''
+    codegen.initialize_llvm()
+    optimization = codegen.pipeline(optimization)
+    prints = fingerprints(ast, bool(optimization))
+    with timed(timer, 'check'):
+        entries = check(ast, prints, cache)
+
+    # ir of the functions that changed; the others are declared
+    funcs = {func.globid: func for func in ast.funcs.funcs}
+    fresh = set(funcs) - set(entries)
+    if optimization:
+        # cached functions were stored folded and analyzed
+        params = constfold.signatures(ast)
+        with timed(timer, 'fold'):
+            folder = constfold.Folder(params)
+            for name in fresh:
+                folder.visit(funcs[name])
+        with timed(timer, 'ranges'):
+            analyzer = ranges.Analyzer(params)
+            for name in fresh:
+                analyzer.visit(funcs[name])
+    with timed(timer, 'generate_ir'):
+        module = codegen.generate_ir(ast, only=fresh)
+    sizes, callees = {}, {}
+    for func in module.functions:
+        if not ekparallel.shared(func):
+            continue
+        sizes[func.name] = ekparallel.function_size(func)
+        callees[func.name] = [callee.name for callee in ekparallel.callees(func)]
+        if func.name in fresh:
+            cache.store(prints[func.name] + '.func', {
+                'func': funcs[func.name], 'size': sizes[func.name], 'calls': callees[func.name]})
+    for name, entry in entries.items():
+        sizes[name], callees[name] = entry['size'], entry['calls']
+
+    names = [name for name in prints if name in sizes]
+    groups = ekparallel.group(names, sizes, callees, optimization)
+    parts = []
+    for group in groups:
+        key = part_key(group, prints, optimization)
+        parts.append((key, group, cache.lookup(key + '.part')))
+
+    # a missed group may hold functions that only were declared
+    stale = {name for _, group, part in parts if part is None for name in group}
+    if stale & set(entries):
+        with timed(timer, 'generate_ir'):
+            module = codegen.generate_ir(ast, only=fresh | (stale & set(funcs)))
+
+    objects, is_modified = [], False
+    with timed(timer, 'optimize'):
+        for key, group, part in parts:
+            if part is None:
+                obj, modified = ekparallel.compile_part(ekparallel.part_ir(module, set(group)), optimization)
+                part = {'object': obj, 'modified': modified}
+                cache.store(key + '.part', part)
+            objects.append(part['object'])
+            is_modified = is_modified or part['modified']
+    cache.evict()
+    return objects, is_modified
+
+def jit(ast, sysarg, optimization, cache, timer=None):
+    '''
+    build, then load the objects and call run with the program arguments
+    sysarg
+    Return the exit status of run
+    '''
+    objects, is_modified = build(ast, optimization, cache, timer)
+    if codegen.pipeline(optimization):
+        # check if the optimizations made any modification to the module
+        print("Optimizations made modification to the module: ", is_modified)
+    with timed(timer, 'run'):
+        return ekparallel.run_objects(objects, sysarg)
+
+def execute(ast, sysarg, optimization, cache, timer=None):
+    result = jit(ast, sysarg, optimization, cache, timer)
+    print("\nexit: {}".format(result))
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+import llvmlite
+import llvmlite.binding as llvm
+import codegen
+
+DEFAULT_DIR = os.environ.get('EKCC_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ekcc')
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+# modules whose source decides the generated code: every module the front
+# end imports except the timing and caching ones and the parser tables,
+# which follow from ekparser.py
+COMPILER_MODULES = ['eklexer.py', 'ekparser.py', 'ekast.py', 'scope.py', 'strings.py',
+                    'semanticsChecker.py', 'constfold.py', 'ranges.py', 'frontend.py',
+                    'codegen.py', 'options.py', 'ekparallel.py', 'incremental.py']
+
+compiler_digest = None
+
+
+def compiler_version():
+    '''
+    Digest of the compiler sources and llvmlite version, so entries are
+    never reused across compiler changes
+    '''
+    global compiler_digest
+    if compiler_digest is None:
+        h = hashlib.sha256(llvmlite.__version__.encode('utf8'))
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in COMPILER_MODULES:
+            with open(os.path.join(here, name), 'rb') as f:
+                h.update(f.read())
+        compiler_digest = h.hexdigest()
+    return compiler_digest
+
+def cache_key(source_code, optimization):
+    '''
+    Hash of everything the machine code depends on: source text, optimization
+    settings, compiler and host target; the program arguments are read at
+    run time, so one entry serves every argument list
+    '''
+    codegen.initialize_llvm()
+    h = hashlib.sha256()
+    for part in [source_code, repr(codegen.pipeline(optimization)),
+                 compiler_version(), llvm.get_default_triple(),
+                 llvm.get_host_cpu_name(), llvm.get_host_cpu_features().flatten()]:
+        h.update(part.encode('utf8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class ObjectCache:
+    '''
+    On-disk cache of optimized bitcode and object code, one <key>.bc,
+    <key>.mod and <key>.o per program; .mod records whether the passes
+    modified the module, so a hit reports what the miss did. The mtime of
+    the .o file is the LRU clock and the total size is kept under max_size
+    Processes may share a directory: writes go through unique temp files
+    '''
+    def __init__(self, directory=DEFAULT_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def lookup(self, key):
+        '''
+        Return (bitcode, object code, is_modified) for key, or None on a miss;
+        is_modified is None when no pass ran
+        '''
+        try:
+            with open(self.path(key, '.bc'), 'rb') as f:
+                bitcode = f.read()
+            with open(self.path(key, '.mod'), 'rb') as f:
+                is_modified = MODIFIED[f.read()]
+            with open(self.path(key, '.o'), 'rb') as f:
+                obj = f.read()
+        except (OSError, KeyError):
+            return None
+        try:
+            os.utime(self.path(key, '.o'))
+        except OSError:
+            # evicted by another process meanwhile; the data is read
+            pass
+        return bitcode, obj, is_modified
+
+    def store(self, key, bitcode, obj, is_modified=None):
+        # .o is written last so a lookup never sees it without the others
+        for ext, data in [('.bc', bitcode), ('.mod', FLAGS[is_modified]), ('.o', obj)]:
+            write_file(self.directory, self.path(key, ext), data)
+        self.evict()
+
+    def evict(self):
+        ''' Drop least recently used entries until the cache fits max_size '''
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.o'):
+                continue
+            key = name[:-2]
+            try:
+                size = os.path.getsize(self.path(key, '.o')) + os.path.getsize(self.path(key, '.bc'))
+                used = os.path.getmtime(self.path(key, '.o'))
+            except OSError:
+                continue
+            entries.append((used, size, key))
+            total += size
+        entries.sort()
+        for used, size, key in entries:
+            if total <= self.max_size:
+                break
+            for ext in ['.o', '.mod', '.bc']:
+                try:
+                    os.unlink(self.path(key, ext))
+                except OSError:
+                    pass
+            total -= size
+
+
+# .mod contents: whether the passes modified the module, None if none ran
+FLAGS = {None: b'', False: b'0', True: b'1'}
+MODIFIED = {data: value for value, data in FLAGS.items()}
+
+def write_file(directory, path, data):
+    ''' Write path whole: through a temp file of its own, then renamed '''
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def execute_cached(cache, key, args=()):
+    '''
+    Load a cached program and call run with the program arguments args,
+    skipping the whole front end, codegen and optimization
+    Return the exit status of run, or None on a cache miss
+    '''
+    entry = cache.lookup(key)
+    if entry is None:
+        return None
+    bitcode, obj, is_modified = entry
+    codegen.report_modified(is_modified)
+    codegen.initialize_llvm()
+    parsed_module = llvm.parse_bitcode(bitcode)
+    return codegen.run_module(parsed_module, args, getbuffer=lambda module: obj)
+
+def execute(module, optimization, cache, key, args=()):
+    '''
+    codegen.jit that stores the optimized module and its object code
+    Return the exit status of run
+    '''
+    parsed_module, is_modified = codegen.prepare_module(module, optimization)
+    codegen.report_modified(is_modified)
+    bitcode = parsed_module.as_bitcode()
+
+    def notify(llvm_module, obj):
+        cache.store(key, bitcode, obj, is_modified)
+
+    return codegen.run_module(parsed_module, args, notify=notify)
@@ -0,0 +1,32 @@
+'''
+Optimization options of the ekcc and ekclient command lines, kept free of
+llvmlite so the client starts without it
+'''
+
+# optimization level name -> (opt level, size level) of the PassManagerBuilder
+OPT_LEVELS = {
+    '0': (0, 0), '1': (1, 0), '2': (2, 0), '3': (3, 0),
+    's': (2, 1), 'z': (2, 2),
+}
+
+
+def add_optimization_arguments(parser, passes=None):
+    '''
+    Add -O, -O<level>, --inline-threshold and --passes to parser; the names
+    in passes are listed in the --passes help
+    '''
+    parser.add_argument('-O', action='store_const', const='3', default='0',
+                        dest='opt_level', help='optimization mode, same as -O3')
+    for level in sorted(OPT_LEVELS):
+        parser.add_argument('-O' + level, action='store_const', const=level,
+                            dest='opt_level', help='optimization level ' + level)
+    parser.add_argument('--inline-threshold', type=int, default=None,
+                        help='inliner threshold, default from the optimization level')
+    help = 'comma separated passes run after the optimization level'
+    if passes is not None:
+        help += ', from: ' + ','.join(sorted(passes))
+    parser.add_argument('--passes', default='', help=help)
+
+def pass_names(passes):
+    ''' The names in a --passes value '''
+    return [p for p in passes.split(',') if p]
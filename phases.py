@@ -0,0 +1,99 @@
+import json
+import re
+import time
+from contextlib import contextmanager
+import llvmlite.binding as llvm
+
+# one row of the llvm pass timing report: "<time> (<pct>%)" per column, then the pass name
+REPORT_TIME = re.compile(r'(\d+\.\d+)\s+\(\s*[\d.]+%\)')
+REPORT_COLUMNS = [('User Time', 'user'), ('System Time', 'system'),
+                  ('User+System', 'cpu'), ('Wall Time', 'wall')]
+
+
+class PhaseTimer:
+    '''
+    Wall (perf_counter) and cpu (process_time) seconds of each compiler
+    phase in the order they ran; optimization passes are recorded from the
+    llvm pass timing report as "pass: <name>"
+    '''
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add(self, name, wall, cpu):
+        self.phases.append({'phase': name, 'wall': wall, 'cpu': cpu})
+
+    @contextmanager
+    def passes(self, name):
+        ''' Time a pass manager run as phase name and each pass in it '''
+        llvm.set_time_passes(True)
+        try:
+            with self.phase(name):
+                yield
+        finally:
+            report = llvm.report_and_reset_timings()
+            llvm.set_time_passes(False)
+        for pass_name, wall, cpu in parse_pass_report(report):
+            self.add('pass: ' + pass_name, wall, cpu)
+
+    def total(self):
+        # pass rows are already counted in the phase that ran them
+        rows = [p for p in self.phases if not p['phase'].startswith('pass: ')]
+        return sum(p['wall'] for p in rows), sum(p['cpu'] for p in rows)
+
+    def table(self):
+        width = max([len(p['phase']) for p in self.phases] + [len('total')])
+        lines = ['{:<{w}}  {:>10}  {:>10}'.format('phase', 'wall (s)', 'cpu (s)', w=width)]
+        for p in self.phases:
+            lines.append('{:<{w}}  {:>10.6f}  {:>10.6f}'.format(p['phase'], p['wall'], p['cpu'], w=width))
+        wall, cpu = self.total()
+        lines.append('{:<{w}}  {:>10.6f}  {:>10.6f}'.format('total', wall, cpu, w=width))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        wall, cpu = self.total()
+        return json.dumps({'phases': self.phases, 'total': {'wall': wall, 'cpu': cpu}})
+
+
+def parse_pass_report(report):
+    '''
+    Read the per pass rows of the text llvm prints for set_time_passes
+    Return a list of (pass name, wall seconds, cpu seconds)
+    '''
+    columns = None
+    rows = []
+    for line in report.splitlines():
+        if columns is None:
+            if '--- Name ---' in line:
+                columns = [key for title, key in REPORT_COLUMNS if title in line]
+            continue
+        times = REPORT_TIME.findall(line)
+        if len(times) != len(columns):
+            # the Total row closes the first table
+            break
+        name = REPORT_TIME.sub('', line).strip()
+        if name == 'Total':
+            break
+        values = dict(zip(columns, map(float, times)))
+        cpu = values.get('cpu', values.get('user', 0.0) + values.get('system', 0.0))
+        rows.append((name, values.get('wall', cpu), cpu))
+    return rows
+
+@contextmanager
+def untimed():
+    yield
+
+def timed(timer, name):
+    ''' timer.phase(name), or nothing when not timing '''
+    return untimed() if timer is None else timer.phase(name)
+
+def timed_passes(timer, name):
+    ''' timer.passes(name), or nothing when not timing '''
+    return untimed() if timer is None else timer.passes(name)
@@ -0,0 +1,338 @@
+import ekast
+import codegen
+from constfold import INT_MIN, INT_MAX, sdiv, signatures, walk
+
+TOP = (INT_MIN, INT_MAX)
+ARITH = ['add', 'sub', 'mul', 'div']
+# loops nested deeper do not assume counting directions, so a body is
+# analyzed at most 2 ** SPECULATE_DEPTH times
+SPECULATE_DEPTH = 4
+
+
+def kind(exp):
+    return codegen.TYPE_KINDS.get(exp.type)
+
+def is_int(type):
+    return codegen.TYPE_KINDS.get(type) in ('int', 'cint')
+
+def join(a, b):
+    ''' Union of two environments; None is unreachable code '''
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return {var: (min(a[var][0], b[var][0]), max(a[var][1], b[var][1])) for var in a}
+
+def step(assign):
+    ''' 'up' for $v = $v + c or c + $v, 'down' for $v = $v - c (c >= 0), else 'any' '''
+    exp = assign.exp
+    if not isinstance(exp, ekast.BinOp) or exp.op not in ('add', 'sub'):
+        return 'any'
+    operands = [(exp.lhs, exp.rhs)] + ([(exp.rhs, exp.lhs)] if exp.op == 'add' else [])
+    for var, amount in operands:
+        if isinstance(var, ekast.VarVal) and var.var == assign.var and \
+                isinstance(amount, ekast.Lit) and isinstance(amount.value, int) and \
+                0 <= amount.value <= INT_MAX:
+            return 'up' if exp.op == 'add' else 'down'
+    return 'any'
+
+def exact(op, lhs, rhs):
+    '''
+    Interval of the exact (unbounded) result of op over two intervals, or
+    None when division may divide by zero
+    '''
+    if op == 'div':
+        if rhs[0] <= 0 <= rhs[1]:
+            return None
+        corners = [sdiv(l, r) for l in lhs for r in rhs]
+    else:
+        fn = {'add': lambda l, r: l + r, 'sub': lambda l, r: l - r, 'mul': lambda l, r: l * r}[op]
+        corners = [fn(l, r) for l in lhs for r in rhs]
+    return min(corners), max(corners)
+
+
+class Analyzer(ekast.Visitor):
+    '''
+    Interval analysis of the int and cint locals of each function, marking
+    cint arithmetic and negation that cannot overflow as safe, so codegen
+    leaves out their overflow checks
+    Tracked locals are the int / cint ones declared once and never passed
+    to a call or bound to a ref, so only their own assignments change
+    them; conditions comparing a local narrow it in the branch they guard
+    A node is safe only if every visit that is kept proves it
+    Statements take and return the environment (local -> (lo, hi), None
+    when unreachable); expressions return their interval (None when not
+    an int) and update the environment for assignments
+    '''
+    def __init__(self, params):
+        super().__init__()
+        self.params = params
+
+    def visit_Prog(self, ast):
+        for func in ast.funcs.funcs:
+            self.visit(func)
+        return ast
+
+    def visit_Func(self, func):
+        self.proofs = {}
+        self.nodes = {}
+        self.depth = 0
+        self.cint_names = set()
+        self.tracked = self.trackable(func)
+        env = {var: TOP for var in self.tracked}
+        if func.vdecls is not None:
+            for vdecl in func.vdecls.vars:
+                if 'cint' in vdecl.type:
+                    self.cint_names.add(vdecl.var)
+        self.visit(func.blk, env)
+        for key, safe in self.proofs.items():
+            self.nodes[key].safe = safe
+        return func
+
+    def trackable(self, func):
+        declared = {}
+        escaped = set()
+        if func.vdecls is not None:
+            for vdecl in func.vdecls.vars:
+                declared[vdecl.var] = 1 if is_int(vdecl.type) and 'ref' not in vdecl.type else 2
+        for node in walk(func.blk):
+            if isinstance(node, ekast.VarDeclStmt):
+                var = node.vdecl.var
+                # a ref aliases another variable, its writes are not seen
+                tracked = is_int(node.vdecl.type) and 'ref' not in node.vdecl.type
+                declared[var] = declared.get(var, 0) + (1 if tracked else 2)
+                if 'ref' in node.vdecl.type and isinstance(node.exp, (ekast.VarVal, ekast.Assign)):
+                    escaped.add(node.exp.var)
+            elif isinstance(node, ekast.FuncCall) and node.params is not None:
+                for param in node.params.exps:
+                    if isinstance(param, (ekast.VarVal, ekast.Assign)):
+                        escaped.add(param.var)
+        return {var for var, count in declared.items() if count == 1 and var not in escaped}
+
+    def prove(self, node, safe):
+        self.nodes[id(node)] = node
+        self.proofs[id(node)] = self.proofs.get(id(node), True) and safe
+
+    # statements
+    def visit_Blk(self, blk, env):
+        if blk.contents is not None:
+            for stmt in blk.contents.stmts:
+                if env is None:
+                    break
+                env = self.visit(stmt, env)
+        return env
+
+    def visit_BlkStmt(self, stmt, env):
+        return self.visit(stmt.contents, env)
+
+    def visit_VarDeclStmt(self, stmt, env):
+        vdecl = stmt.vdecl
+        if 'ref' in vdecl.type or stmt.exp is None:
+            return env
+        cint = 'cint' in vdecl.type
+        if cint:
+            self.cint_names.add(vdecl.var)
+        value = self.eval(stmt.exp, env, cint)
+        if vdecl.var in self.tracked:
+            env[vdecl.var] = self.stored(value, stmt.exp)
+        return env
+
+    def stored(self, value, exp):
+        # int stores keep the value; bools are zero extended, floats unknown
+        if value is not None:
+            return value
+        return (0, 1) if kind(exp) == 'bool' else TOP
+
+    def visit_Ret(self, stmt, env):
+        if stmt.exp is not None:
+            self.eval(stmt.exp, env)
+        return None
+
+    def visit_ExpStmt(self, stmt, env):
+        self.eval(stmt.exp, env)
+        return env
+
+    def visit_Print(self, stmt, env):
+        self.eval(stmt.exp, env)
+        return env
+
+    def visit_PrintSlit(self, stmt, env):
+        return env
+
+    def visit_If(self, stmt, env):
+        self.eval(stmt.cond, env)
+        # an unreachable branch is not visited, so it keeps its checks
+        then = self.narrow(stmt.cond, dict(env), True)
+        if then is not None:
+            then = self.visit(stmt.stmt, then)
+        otherwise = self.narrow(stmt.cond, dict(env), False)
+        if stmt.else_stmt is not None and otherwise is not None:
+            otherwise = self.visit(stmt.else_stmt, otherwise)
+        return join(then, otherwise)
+
+    def visit_While(self, stmt, env):
+        '''
+        The head of the loop (where the condition is evaluated) keeps the
+        locals the loop does not write; a local it only counts up from its
+        entry value (or only down) is assumed to stay at or above (below)
+        it, the rest are unknown. The body is analyzed once from there; if
+        the back edge breaks an assumption, again without it
+        '''
+        directions = self.writes(stmt)
+        head = dict(env)
+        for var, direction in directions.items():
+            head[var] = {'up': (env[var][0], INT_MAX), 'down': (INT_MIN, env[var][1])}.get(direction, TOP)
+        proofs = dict(self.proofs)
+        speculated = self.depth < SPECULATE_DEPTH and \
+            any(direction in ('up', 'down') for direction in directions.values())
+        if not speculated:
+            for var in directions:
+                head[var] = TOP
+        self.depth += 1
+        while True:
+            after = self.loop(stmt, dict(head))
+            if not speculated or join(head, after) == head:
+                break
+            self.proofs = proofs
+            for var in directions:
+                head[var] = TOP
+            speculated = False
+        self.depth -= 1
+        self.eval(stmt.cond, head)
+        return self.narrow(stmt.cond, head, False)
+
+    def loop(self, stmt, head):
+        '''
+        Environment at the back edge, before the condition is evaluated
+        again, of an iteration starting from head
+        '''
+        self.eval(stmt.cond, head)
+        body = self.narrow(stmt.cond, head, True)
+        if body is not None:
+            body = self.visit(stmt.stmt, body)
+        return body
+
+    def writes(self, stmt):
+        '''
+        Tracked locals written in a loop: 'up' when every write adds a
+        non-negative literal to the local itself, 'down' when every write
+        subtracts one, otherwise 'any'
+        '''
+        directions = {}
+        for node in walk([stmt.cond, stmt.stmt]):
+            if isinstance(node, ekast.VarDeclStmt) and node.vdecl.var in self.tracked:
+                directions[node.vdecl.var] = 'any'
+            elif isinstance(node, ekast.Assign) and node.var in self.tracked:
+                direction = step(node)
+                if directions.get(node.var, direction) != direction:
+                    direction = 'any'
+                directions[node.var] = direction
+        return directions
+
+    def narrow(self, cond, env, taken):
+        '''
+        env where cond evaluated to taken: comparisons of a tracked local
+        with an int expression narrow it, && narrows both sides when taken
+        Return None when the branch cannot be taken
+        '''
+        if env is None:
+            return None
+        if isinstance(cond, ekast.BinOp) and cond.op == 'and' and taken:
+            env = self.narrow(cond.lhs, env, True)
+            return self.narrow(cond.rhs, env, True)
+        if not isinstance(cond, ekast.BinOp) or cond.op not in ('lt', 'gt', 'eq'):
+            return env
+        for var, other, op in [(cond.lhs, cond.rhs, cond.op),
+                               (cond.rhs, cond.lhs, {'lt': 'gt', 'gt': 'lt', 'eq': 'eq'}[cond.op])]:
+            if isinstance(var, ekast.VarVal) and var.var in env:
+                bound = self.peek(other, env)
+                if bound is None:
+                    return env
+                lo, hi = env[var.var]
+                if op == 'lt':
+                    lo, hi = (lo, min(hi, bound[1] - 1)) if taken else (max(lo, bound[0]), hi)
+                elif op == 'gt':
+                    lo, hi = (max(lo, bound[0] + 1), hi) if taken else (lo, min(hi, bound[1]))
+                elif taken:
+                    lo, hi = max(lo, bound[0]), min(hi, bound[1])
+                if lo > hi:
+                    return None
+                env[var.var] = (lo, hi)
+                return env
+        return env
+
+    def peek(self, exp, env):
+        ''' Interval of a side effect free exp without recording proofs '''
+        if isinstance(exp, ekast.Lit) and is_int(exp.type) and isinstance(exp.value, int) \
+                and INT_MIN <= exp.value <= INT_MAX:
+            return exp.value, exp.value
+        if isinstance(exp, ekast.VarVal) and exp.var in env:
+            return env[exp.var]
+        return None
+
+    # expressions
+    def eval(self, exp, env, cint=False):
+        return self.visit(exp, env, cint)
+
+    def visit_Lit(self, exp, env, cint):
+        if is_int(exp.type) and isinstance(exp.value, int) and INT_MIN <= exp.value <= INT_MAX:
+            return exp.value, exp.value
+        return TOP if is_int(exp.type) else None
+
+    def visit_VarVal(self, exp, env, cint):
+        if exp.var in env:
+            return env[exp.var]
+        return TOP if is_int(exp.type) else None
+
+    def visit_FuncCall(self, exp, env, cint):
+        if exp.params is not None:
+            params = self.params.get(exp.globid) or []
+            for index, param in enumerate(exp.params.exps):
+                if exp.globid in ('getarg', 'getargf'):
+                    self.eval(param, env)
+                elif index < len(params) and not params[index][0]:
+                    self.eval(param, env, params[index][1])
+        return TOP if is_int(exp.type) else None
+
+    def visit_Assign(self, exp, env, cint):
+        cint = exp.var in self.cint_names or 'cint' in (exp.type or '')
+        value = self.eval(exp.exp, env, cint)
+        if exp.var in env:
+            env[exp.var] = self.stored(value, exp.exp)
+        return None
+
+    def visit_Cast(self, exp, env, cint):
+        value = self.eval(exp.exp, env)
+        if not is_int(exp.type):
+            return None
+        if kind(exp.exp) == 'bool':
+            return 0, 1
+        return value if value is not None else TOP
+
+    def visit_UOp(self, exp, env, cint):
+        value = self.eval(exp.exp, env, cint)
+        if exp.op != 'minus' or not is_int(exp.type):
+            return None
+        value = value or TOP
+        if cint:
+            self.prove(exp, value[0] > INT_MIN)
+        if value[0] == INT_MIN:
+            return TOP
+        return -value[1], -value[0]
+
+    def visit_BinOp(self, exp, env, cint):
+        lhs = self.eval(exp.lhs, env, cint)
+        rhs = self.eval(exp.rhs, env, cint)
+        if exp.op not in ARITH or kind(exp.lhs) not in ('int', 'cint'):
+            return None
+        lhs, rhs = lhs or TOP, rhs or TOP
+        value = exact(exp.op, lhs, rhs)
+        fits = value is not None and INT_MIN <= value[0] and value[1] <= INT_MAX
+        if cint or kind(exp.lhs) == 'cint':
+            self.prove(exp, fits)
+        return value if fits else TOP
+
+
+# main function
+def analyze(ast):
+    return Analyzer(signatures(ast)).visit(ast)
@@ -0,0 +1,42 @@
+class Scope:
+    '''
+    One level of a chained symbol table: the names bound in a block and a
+    link to the enclosing scope
+    Lookups walk outwards, bindings go into the innermost scope, so entering
+    a block costs only the names it declares
+    '''
+    __slots__ = ('names', 'parent')
+
+    def __init__(self, parent=None):
+        self.names = {}
+        self.parent = parent
+
+    def child(self):
+        ''' Return a new scope nested in this one '''
+        return Scope(self)
+
+    def __getitem__(self, name):
+        scope = self
+        while scope is not None:
+            names = scope.names
+            if name in names:
+                return names[name]
+            scope = scope.parent
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        self.names[name] = value
+
+    def __contains__(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.names:
+                return True
+            scope = scope.parent
+        return False
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
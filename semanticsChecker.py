@@ -1,200 +1,188 @@
-import copy
+import ekast
+from scope import Scope
+
+VDECL_VOID = 'error: In <vdecl>, the type may not be void.'
+REF_VOID = 'error: In <ref type> the type may not be void or itself a reference type.'
+FUNC_REF = 'error: A function may not return a ref type.'
+REF_INIT = 'error: The initialization expression for a reference variable (including function arguments) must be a variable.'
+RUN_FUNC = 'error: All programs must define exactly one function named “run” which returns an integer (the program exit status) and takes no arguments.'
 
-# In <vdecl> ​,the type may not be void.
-def vdeclVoidCheck(ast):
-    vdecls = list(find('vdecl', ast))
-    for vdecl in vdecls:
-        if vdecl['type'] == 'void':
-            raise TypeError('error: In <vdecl>, the type may not be void.')
-    
-    func_vdecls = list(find('vdecls', ast))
-    for vdecls in func_vdecls:
-        for vdecl in vdecls['vars']:
-            if vdecl['type'] == 'void':
-                raise TypeError('error: In <vdecl>, the type may not be void.')
- 
 # In ​ ref ​ <type>​, the type may not be void or itself a reference type.
-def refVoidCheck(ast):
-    types = list(find('types', ast)) + list(find('ret_type', ast)) + list(find('type', ast))
-    for t in types:
-        if ('ref' in t and 'void' in t) or (t.count('ref') > 1):
-            raise TypeError('error: In <ref type> the type may not be void or itself a reference type.')
-
-# All functions must be declared and/or defined before they are used.
-def functionOrderCheck(ast, typeOfDeclaredFunctions):
-    funcs = ast['funcs']['funcs']
-    if 'externs' in ast:
-            for extern in ast['externs']['externs']:
-                typeOfDeclaredFunctions[extern['globid']] = extern['ret_type']
-    for func in funcs:
-        typeOfDeclaredFunctions[func['globid']] = func['ret_type']
-        globids = list(find('globid', func))
-        for functionCall in globids:
-            if functionCall not in typeOfDeclaredFunctions:
-                raise NameError('error: Cannot find function {}'.format(functionCall))
-    
-    ast['funcList'] = typeOfDeclaredFunctions
-
-# A function may not return a ref type.
-def funcitonRefTypeCheck(ast):
-    funcs = ast['funcs']['funcs']
-    for func in funcs:
-        if 'ref' in func['ret_type']:
-            raise RuntimeError('error: A function may not return a ref type.')
-
-# The initialization expression for a reference variable (including function arguments) must be a variable.
-def refInitializationCheck(ast):
-    stmts = list(find('stmts', ast))
-    flat_list = [item for sublist in stmts for item in sublist]
-    for stmt in flat_list:
-        if not stmt['name'] == 'vardeclstmt':
-            continue
-        if not 'ref' in stmt['vdecl']['type']:
-            continue
-        if stmt['exp']['name'] == 'lit':
-            raise RuntimeError('error: The initialization expression for a reference variable (including function arguments) must be a variable.')
-
-# All programs must define exactly one function named “run” which returns an integer (the program exit status) and takes no arguments.
-def runFunctionExistCheck(ast):
-    funcs = ast['funcs']['funcs']
-    numOfRunFunc = 0
-    for func in funcs:
-        if func['globid'] == 'run':
-            if func['ret_type'] != 'int' or 'vdecls' in func:
-                raise RuntimeError('error: All programs must define exactly one function named “run” which returns an integer (the program exit status) and takes no arguments.')
-                return
-            numOfRunFunc += 1
-    if numOfRunFunc != 1:
-        raise RuntimeError('error: All programs must define exactly one function named “run” which returns an integer (the program exit status) and takes no arguments.')
-
-# For every expression, determine its type 
-def addTypeToExp(ast, typeOfDeclaredFunctions):
-    for func in ast['funcs']['funcs']:
-        typeOfDeclaredVariable = {}
-        if 'vdecls' in func:
-            for vdecl in func['vdecls']['vars']:
-                typeOfDeclaredVariable[vdecl['var']] = vdecl['type']
-                if 'ref' in vdecl['type'] and 'noalias' in vdecl['type']:
-                    typeOfDeclaredVariable[vdecl['var']] = vdecl['type'][12:]
-                elif 'ref' in vdecl['type']:
-                    typeOfDeclaredVariable[vdecl['var']] = vdecl['type'][4:]
-
-        func['blk']['typeOfDeclaredVariable'] = typeOfDeclaredVariable
-        blkTraversal(func['blk'], typeOfDeclaredFunctions)
-    return ast
-
-
-def blkTraversal(blk, typeOfDeclaredFunctions):
-    typeOfDeclaredVariable = blk['typeOfDeclaredVariable']
-    statements = list(find('stmts', blk))
-    flat_list = [item for sublist in statements for item in sublist]
-    for stmt in flat_list:
-        stmtTraversal(stmt, typeOfDeclaredFunctions, typeOfDeclaredVariable)
-
-
-def stmtTraversal(stmt, typeOfDeclaredFunctions, typeOfDeclaredVariable):
-    if 'vdecl' in stmt:
-        vdecl = stmt['vdecl']
-        typeOfDeclaredVariable[vdecl['var']] = vdecl['type']
-    if stmt['name'] in ['blk', 'while']:
-        stmt['typeOfDeclaredVariable'] = copy.deepcopy(typeOfDeclaredVariable)
-        blkTraversal(stmt, typeOfDeclaredFunctions)
-    elif stmt['name'] in ['if']:
-        stmt['stmt']['typeOfDeclaredVariable'] = copy.deepcopy(typeOfDeclaredVariable)
-        stmtTraversal(stmt['stmt'], typeOfDeclaredFunctions, typeOfDeclaredVariable)
-        if 'else_stmt' in stmt:
-            stmt['else_stmt']['typeOfDeclaredVariable'] = copy.deepcopy(typeOfDeclaredVariable)
-            stmtTraversal(stmt['else_stmt'], typeOfDeclaredFunctions, typeOfDeclaredVariable)
-
-    if 'cond' in stmt:
-        expTraversal(stmt['cond'], typeOfDeclaredVariable, typeOfDeclaredFunctions)
-        return None
-    if 'exp' not in stmt:
-        return None
-    expTraversal(stmt['exp'], typeOfDeclaredVariable, typeOfDeclaredFunctions)
-
-# function arguments can be void and what not, or strings
-def expTraversal(exp, knownVars, typeOfDeclaredFunctions):
-    if 'type' in exp:
-        if exp['name'] == "caststmt":
-            expTraversal(exp['exp'], knownVars, typeOfDeclaredFunctions)
-        return exp['type']
+def refVoidCheck(t):
+    if ('ref' in t and 'void' in t) or (t.count('ref') > 1):
+        raise TypeError(REF_VOID)
+
+# In <vdecl> ​,the type may not be void.
+def vdeclCheck(vdecl):
+    if vdecl.type == 'void':
+        raise TypeError(VDECL_VOID)
+    refVoidCheck(vdecl.type)
+
+
+class Analyzer(ekast.Visitor):
+    '''
+    Check the semantic rules and determine the type of every expression
+    in a single walk over the ast
+    Statements take the scope of variable types visible to them;
+    expressions store their type on the node and return it
+    '''
+    def __init__(self):
+        super().__init__()
+        self.typeOfDeclaredFunctions = {}
+        self.numOfRunFunc = 0
+
+    def visit_Prog(self, ast):
+        if ast.externs is not None:
+            for extern in ast.externs.externs:
+                self.visit(extern)
+        for func in ast.funcs.funcs:
+            self.visit(func)
+
+        # All programs must define exactly one function named “run”
+        if self.numOfRunFunc != 1:
+            raise RuntimeError(RUN_FUNC)
+        ast.funcList = self.typeOfDeclaredFunctions
+        return ast
+
+    def visit_Extern(self, extern):
+        refVoidCheck(extern.ret_type)
+        if extern.tdecls is not None:
+            for t in extern.tdecls.types:
+                refVoidCheck(t)
+        self.typeOfDeclaredFunctions[extern.globid] = extern.ret_type
+
+    def visit_Func(self, func):
+        self.visit(func.blk, self.declare(func))
+
+    def declare(self, func):
+        '''
+        Check the signature of func and make it visible to itself and the
+        functions after it
+        Return the scope of its parameters
+        '''
+        refVoidCheck(func.ret_type)
+        # A function may not return a ref type.
+        if 'ref' in func.ret_type:
+            raise RuntimeError(FUNC_REF)
+        # “run” returns an integer and takes no arguments.
+        if func.globid == 'run':
+            if func.ret_type != 'int' or func.vdecls is not None:
+                raise RuntimeError(RUN_FUNC)
+            self.numOfRunFunc += 1
+
+        # All functions must be declared and/or defined before they are
+        # used; a function may call itself
+        self.typeOfDeclaredFunctions[func.globid] = func.ret_type
+
+        typeOfDeclaredVariable = Scope()
+        if func.vdecls is not None:
+            for vdecl in func.vdecls.vars:
+                vdeclCheck(vdecl)
+                typeOfDeclaredVariable[vdecl.var] = vdecl.type
+                if 'ref' in vdecl.type and 'noalias' in vdecl.type:
+                    typeOfDeclaredVariable[vdecl.var] = vdecl.type[12:]
+                elif 'ref' in vdecl.type:
+                    typeOfDeclaredVariable[vdecl.var] = vdecl.type[4:]
+        return typeOfDeclaredVariable
+
+    # statements
+    def visit_Blk(self, blk, knownVars):
+        if blk.contents is not None:
+            for stmt in blk.contents.stmts:
+                self.visit(stmt, knownVars)
+
+    def visit_BlkStmt(self, stmt, knownVars):
+        self.visit(stmt.contents, knownVars.child())
+
+    def visit_While(self, stmt, knownVars):
+        self.visit(stmt.cond, knownVars)
+        # a block body shares the scope of the while statement
+        body = stmt.stmt
+        if isinstance(body, ekast.BlkStmt):
+            body = body.contents
+        self.visit(body, knownVars.child())
+
+    def visit_If(self, stmt, knownVars):
+        self.visit(stmt.cond, knownVars)
+        for branch in [stmt.stmt, stmt.else_stmt]:
+            if branch is not None:
+                self.visit(branch, knownVars.child())
+
+    def visit_VarDeclStmt(self, stmt, knownVars):
+        vdecl = stmt.vdecl
+        vdeclCheck(vdecl)
+        # The initialization expression for a reference variable must be a variable.
+        if 'ref' in vdecl.type and isinstance(stmt.exp, ekast.Lit):
+            raise RuntimeError(REF_INIT)
+        knownVars[vdecl.var] = vdecl.type
+        self.visit(stmt.exp, knownVars)
+
+    def visit_Ret(self, stmt, knownVars):
+        if stmt.exp is not None:
+            self.visit(stmt.exp, knownVars)
+
+    def visit_ExpStmt(self, stmt, knownVars):
+        self.visit(stmt.exp, knownVars)
+
+    def visit_Print(self, stmt, knownVars):
+        self.visit(stmt.exp, knownVars)
+
+    def visit_PrintSlit(self, stmt, knownVars):
+        pass
+
+    # expressions, lits carry their type from the parser
+    def visit_Lit(self, exp, knownVars):
+        return exp.type
+
+    def visit_Cast(self, exp, knownVars):
+        refVoidCheck(exp.type)
+        self.visit(exp.exp, knownVars)
+        return exp.type
 
     # assignment
-    if exp['name'] == 'assign':
-        t = expTraversal(exp['exp'], knownVars, typeOfDeclaredFunctions)
-        exp['type'] = t
-        knownVars[exp['var']] = t
+    def visit_Assign(self, exp, knownVars):
+        t = self.visit(exp.exp, knownVars)
+        exp.type = t
+        knownVars[exp.var] = t
         return t
 
     # varid
-    if exp['name'] == 'varval':
-        if exp['var'] not in knownVars:
-            raise RuntimeError('error: {} is not defined'.format(exp['var']))
-        exp['type'] = knownVars[exp['var']]
-        return exp['type']
+    def visit_VarVal(self, exp, knownVars):
+        if exp.var not in knownVars:
+            raise RuntimeError('error: {} is not defined'.format(exp.var))
+        exp.type = knownVars[exp.var]
+        return exp.type
 
     # funccall
-    if exp['name'] == 'funccall':
-        functionName = exp['globid']
-        if functionName not in typeOfDeclaredFunctions:
-            raise RuntimeError('error: All functions must be declared and/or defined before they are used.')
-        exp['type'] = typeOfDeclaredFunctions[functionName]
-        if 'exps' in exp['params']:
-            for paramExp in exp['params']['exps']:
-                expTraversal(paramExp, knownVars, typeOfDeclaredFunctions)
-        return exp['type']
+    def visit_FuncCall(self, exp, knownVars):
+        functionName = exp.globid
+        if functionName not in self.typeOfDeclaredFunctions:
+            raise NameError('error: Cannot find function {}'.format(functionName))
+        exp.type = self.typeOfDeclaredFunctions[functionName]
+        if exp.params is not None:
+            for paramExp in exp.params.exps:
+                self.visit(paramExp, knownVars)
+        return exp.type
 
     # uop
-    if exp['name'] == 'uop':
-        exp['type'] = expTraversal(exp['exp'], knownVars, typeOfDeclaredFunctions)
-        return exp['type']
-    
+    def visit_UOp(self, exp, knownVars):
+        exp.type = self.visit(exp.exp, knownVars)
+        return exp.type
+
     # binop
-    if exp["name"] == "binop":
-        if 'type' not in exp['lhs']:
-            left = expTraversal(exp['lhs'], knownVars, typeOfDeclaredFunctions)
-        if 'type' not in exp['rhs']:
-            right = expTraversal(exp['rhs'], knownVars, typeOfDeclaredFunctions)
-        
-        if exp['lhs']['type'] != exp['rhs']['type']:
+    def visit_BinOp(self, exp, knownVars):
+        left = self.visit(exp.lhs, knownVars)
+        right = self.visit(exp.rhs, knownVars)
+        if left != right:
             raise RuntimeError('error: The types of a binary operator don’t match.')
-        
-        if exp['op'] in ['eq', 'lt', 'gt', 'and', 'or']:
-            exp['type'] = 'bool'
-            return exp['type']
+
+        if exp.op in ['eq', 'lt', 'gt', 'and', 'or']:
+            exp.type = 'bool'
         else:
-            exp['type'] = exp['lhs']['type']
-            return exp['type']
-
-
-
-# helper function, find all items with a specific key in dictionary
-def find(key, dictionary):
-    if not isinstance(dictionary, dict):
-        return None
-    for k, v in dictionary.items():
-        if k == key:
-            yield v
-        elif isinstance(v, dict):
-            for result in find(key, v):
-                yield result
-        elif isinstance(v, list):
-            for d in v:
-                for result in find(key, d):
-                    yield result
+            exp.type = left
+        return exp.type
+
 
 # main function
 def check(ast):
-    typeOfDeclaredFunctions = {}
-
-    # semantics check
-    vdeclVoidCheck(ast)
-    refVoidCheck(ast)
-    functionOrderCheck(ast, typeOfDeclaredFunctions)
-    funcitonRefTypeCheck(ast)
-    refInitializationCheck(ast)
-    runFunctionExistCheck(ast)
-
-    # add type attribute to 
-    addTypeToExp(ast, typeOfDeclaredFunctions)
+    return Analyzer().visit(ast)
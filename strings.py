@@ -2,7 +2,6 @@ assign = 'assign'
 binop = 'binop'
 blk = 'blk'
 caststmt = 'caststmt'
-cint_args= "def"
 cond = 'cond'
 contents = 'contents'
 else_stmt = 'else_stmt'
@@ -12,6 +11,7 @@ exps = 'exps'
 expstmt = 'expstmt'
 extern = 'extern'
 externs = 'externs'
+flitExp = 'flit'
 func = 'func'
 funcCallExp = 'funccall'
 funcs = 'funcs'
@@ -23,6 +23,7 @@ name = 'name'
 node = 'node'
 op = 'op'
 params = 'params'
+printSlit = 'printslit'
 printStmt = 'print'
 prog = 'prog'
 ret = 'ret'
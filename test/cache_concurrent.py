@@ -0,0 +1,38 @@
+'''
+-cache and -incremental runs of one program in parallel processes share a
+cache directory: every run, whatever it finds cached, prints the same
+output and exits cleanly, also when a tiny --cache-size evicts entries
+while others read them
+'''
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join('test', 'grammar.ek')
+PROCESSES = 8
+
+
+def main():
+    for mode, size in [(mode, size) for mode in ['-cache', '-incremental'] for size in [None, '1']]:
+        with tempfile.TemporaryDirectory() as cache:
+            argv = [sys.executable, 'ekcc.py', '-jit', '-O', mode, '--cache-dir', cache]
+            if size is not None:
+                argv += ['--cache-size', size]
+            outputs = set()
+            for round in range(2):
+                runs = [subprocess.Popen(argv + [SOURCE], cwd=ROOT, stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT, universal_newlines=True)
+                        for _ in range(PROCESSES)]
+                for run in runs:
+                    output, _ = run.communicate()
+                    outputs.add((output, run.returncode))
+            print(mode, '--cache-size', size or 'default',
+                  '{} distinct result(s)'.format(len(outputs)))
+            for output, returncode in sorted(outputs):
+                print(output, end='')
+                print('returncode', returncode)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+'''
+ekclient takes the optimization flags of ekcc and the server applies them
+'''
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join('test', 'grammar.ek')
+RUNS = [
+    ['-jit', '-O2', '--inline-threshold', '100'],
+    ['-jit', '-Oz', '--passes', 'dce,gvn'],
+    ['-jit', '-O0', '--passes', 'nosuchpass'],
+]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ekcc.sock')
+        server = subprocess.Popen([sys.executable, 'ekcc.py', '--serve', '--socket', path],
+                                  cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.05)
+            for args in RUNS:
+                argv = [sys.executable, 'ekclient.py', '--socket', path] + args + [SOURCE]
+                result = subprocess.run(argv, cwd=ROOT, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, universal_newlines=True)
+                print('$ ekclient', ' '.join(args))
+                print(result.stdout, end='')
+                print('returncode', result.returncode)
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+'''
+ekcc.compile: one compile, many runs with different arguments, also from
+several threads at once, and at every optimization level
+'''
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ekcc
+
+SOURCE = '''
+extern int getarg(int);
+extern float getargf(int);
+def int run() {
+  int $i = 0;
+  int $s = 0;
+  while ($i < 100000) {
+    $s = $s + getarg(1);
+    $i = $i + 1;
+  }
+  return getarg(0) * 1000 + $s / 100000 + [int] (getargf(2) * 10.0);
+}
+'''
+
+
+def runs(prog, first, count, failures):
+    for n in range(first, first + count):
+        args = [str(n), str(n % 7), '0.5']
+        status = prog.run(args)
+        if status != n * 1000 + n % 7 + 5:
+            failures.append((args, status))
+
+def main():
+    for opt in (False, '2', 's'):
+        with ekcc.compile(SOURCE, opt=opt) as prog:
+            print(opt, prog.run(['1', '2', '0.25']), prog.run([]), prog.run(['-3', '-1']))
+            failures = []
+            threads = [threading.Thread(target=runs, args=(prog, t * 100, 50, failures))
+                       for t in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            print('threads', 'failed: {}'.format(failures[:3]) if failures else 'ok')
+    try:
+        prog.run([])
+    except RuntimeError as err:
+        print(err)
+
+if __name__ == '__main__':
+    main()
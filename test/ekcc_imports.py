@@ -0,0 +1,14 @@
+'''
+Importing ekcc, for the library or a plain -jit run, loads none of the
+modules of the other modes
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ekcc
+
+MODES = ['ekserver', 'ekbatch', 'ekparallel', 'tiered', 'aot', 'jitcache',
+         'incremental', 'ekwatch', 'bench']
+
+print('loaded:', [name for name in MODES if name in sys.modules])
@@ -0,0 +1,58 @@
+'''
+-incremental: a rebuild reuses the cached functions and parts, and a
+change to one function, or to the signature of one it calls, reaches
+the output
+'''
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM = '''
+extern int getarg(int);
+def {scale_type} scale({scale_type} $n) {{ return $n * {factor}; }}
+def int twice(int $n) {{ return $n + $n; }}
+def int run() {{
+  int $i = 0;
+  {scale_type} $s = 0;
+  while ($i < 10) {{ $s = $s + scale([{scale_type}] $i); $i = $i + 1; }}
+  print $s;
+  print twice(getarg(0));
+  return 0;
+}}
+'''
+STEPS = [
+    ('first build', dict(scale_type='int', factor='[int] 2')),
+    ('unchanged', dict(scale_type='int', factor='[int] 2')),
+    ('scale changed', dict(scale_type='int', factor='[int] 3')),
+    ('scale signature changed', dict(scale_type='cint', factor='[cint] 3')),
+]
+
+
+def entries(cache):
+    directory = os.path.join(cache, 'functions')
+    return set(os.listdir(directory)) if os.path.isdir(directory) else set()
+
+def main():
+    for opt in ['-O0', '-O']:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'prog.ek')
+            cache = os.path.join(tmp, 'cache')
+            for label, values in STEPS:
+                with open(source, 'w') as f:
+                    f.write(PROGRAM.format(**values))
+                before = entries(cache)
+                result = subprocess.run(
+                    [sys.executable, 'ekcc.py', '-jit', opt, '-incremental',
+                     '--cache-dir', cache, source, '21'],
+                    cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    universal_newlines=True)
+                new = entries(cache) - before
+                print('$ {} {}: {} new function(s), {} new part(s)'.format(
+                    opt, label, sum(n.endswith('.func') for n in new),
+                    sum(n.endswith('.part') for n in new)))
+                print(result.stdout, end='')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+'''
+Every module the front end, codegen and -incremental import is part of
+the -cache compiler digest, so changing it never reuses stale machine code
+'''
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import ekparser
+import semanticsChecker
+import frontend
+import incremental
+import jitcache
+
+# imported by the front end without deciding the generated code
+NOT_CODE = {'jitcache.py', 'phases.py', 'ekparsetab.py'}
+
+
+def main():
+    imported = set()
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == ROOT:
+            imported.add(os.path.basename(path))
+    front_end = {name for name in imported if name not in NOT_CODE}
+    print('missing:', sorted(front_end - set(jitcache.COMPILER_MODULES)))
+    print('not found:', [name for name in jitcache.COMPILER_MODULES
+                         if not os.path.exists(os.path.join(ROOT, name))])
+
+if __name__ == '__main__':
+    main()
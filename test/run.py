@@ -0,0 +1,101 @@
+'''
+Regression runner: every test/<name>.ek with `# ekcc:` lines and every
+test/<name>.py is run and its output compared with test/<name>.out
+
+An .ek test is run through ekcc once per `# ekcc: <arguments>` line in
+it, where {src} stands for the test file and {cache} for a fresh cache
+directory shared by the lines of one test. A .py test is run
+with python. Program output and exit lines go to stdout, diagnostics
+such as fold warnings are kept in a separate stderr section
+
+    python test/run.py [--update] [names]
+'''
+import argparse
+import difflib
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+MARKER = '# ekcc:'
+
+
+def commands(path, cache):
+    ''' Return (label, argv) of every run of the test at path '''
+    name = os.path.relpath(path, ROOT)
+    if path.endswith('.py'):
+        return [('python ' + name, [sys.executable, path])]
+    runs = []
+    with open(path) as f:
+        for line in f:
+            if not line.startswith(MARKER):
+                continue
+            words = [w.replace('{src}', name) for w in shlex.split(line[len(MARKER):])]
+            argv = [sys.executable, os.path.join(ROOT, 'ekcc.py')] + words
+            runs.append((' '.join(['ekcc'] + words),
+                         [word.replace('{cache}', cache) for word in argv]))
+    return runs
+
+def output(path):
+    ''' Run every command of the test at path; return the combined report '''
+    report = []
+    with tempfile.TemporaryDirectory() as cache:
+        for label, argv in commands(path, cache):
+            env = dict(os.environ, PYTHONPATH=ROOT)
+            result = subprocess.run(argv, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, universal_newlines=True)
+            report.append('$ {}\n{}'.format(label, result.stdout))
+            if result.stderr:
+                report.append('--- stderr\n' + result.stderr)
+            if result.returncode:
+                report.append('--- returncode {}\n'.format(result.returncode))
+    return ''.join(report)
+
+def is_test(path):
+    if path.endswith('.py'):
+        return os.path.basename(path) != os.path.basename(__file__)
+    with open(path) as f:
+        return any(line.startswith(MARKER) for line in f)
+
+def tests(names):
+    paths = sorted(glob.glob(os.path.join(HERE, '*.ek')) + glob.glob(os.path.join(HERE, '*.py')))
+    paths = [p for p in paths if is_test(p)]
+    if names:
+        paths = [p for p in paths if os.path.splitext(os.path.basename(p))[0] in names]
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update', action='store_true',
+                        help='write the current output as the expected one')
+    parser.add_argument('names', nargs='*', help='tests to run, default all')
+    args = parser.parse_args()
+    failed = 0
+    for path in tests(args.names):
+        expected_file = os.path.splitext(path)[0] + '.out'
+        actual = output(path)
+        if args.update:
+            with open(expected_file, 'w') as f:
+                f.write(actual)
+            print('updated', os.path.relpath(expected_file, ROOT))
+            continue
+        try:
+            with open(expected_file) as f:
+                expected = f.read()
+        except OSError:
+            expected = ''
+        if actual == expected:
+            print('ok     ', os.path.relpath(path, ROOT))
+            continue
+        failed += 1
+        print('FAILED ', os.path.relpath(path, ROOT))
+        sys.stdout.writelines(difflib.unified_diff(
+            expected.splitlines(True), actual.splitlines(True), expected_file, 'actual'))
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import ctypes
+import queue
+import threading
+from ctypes import CFUNCTYPE, c_char_p, c_int
+import llvmlite.binding as llvm
+import codegen
+from phases import timed
+
+HOOK_TYPE = CFUNCTYPE(None, c_char_p)
+
+
+def create_engine(module, optimization):
+    ''' Parse, optionally optimize and jit compile an ir module '''
+    parsed_module = llvm.parse_assembly(str(module))
+    if optimization:
+        codegen.optimize(parsed_module, optimization)
+    parsed_module.verify()
+    target_machine = llvm.Target.from_default_triple().create_target_machine()
+    engine = llvm.create_mcjit_compiler(parsed_module, target_machine)
+    engine.finalize_object()
+    return engine
+
+
+class Tiers:
+    '''
+    Background compiler of the optimized tier
+    The first hot function starts an optimized compile of the whole
+    uninstrumented program; then the slot of each hot function is pointed
+    at its optimized code, so later calls skip the counters, and its osr
+    slot at its loop entry, so a running loop moves over at its back edge
+    '''
+    def __init__(self, ast, optimization):
+        self.ast = ast
+        self.optimization = optimization
+        self.slots = {}
+        self.osr = {}
+        self.hot = queue.Queue()
+        self.engine = None
+        self.installed = []
+        self.hook = HOOK_TYPE(self.notify)
+        self.thread = threading.Thread(target=self.work, daemon=True)
+
+    def notify(self, name):
+        # runs on the jitted code's thread, so only hand the name over
+        self.hot.put(name.decode('utf8'))
+
+    def work(self):
+        while True:
+            name = self.hot.get()
+            if name is None:
+                return
+            if name not in self.slots or name in self.installed:
+                continue
+            if self.engine is None:
+                self.engine = create_engine(codegen.generate_ir(self.ast, osr=True),
+                                            self.optimization)
+            address = self.engine.get_function_address(name)
+            ctypes.c_void_p.from_address(self.slots[name]).value = address
+            if name in self.osr:
+                address = self.engine.get_function_address(codegen.TIER_ENTRY + name)
+                ctypes.c_void_p.from_address(self.osr[name]).value = address
+            self.installed.append(name)
+
+    def start(self):
+        llvm.add_symbol(codegen.TIER_HOOK, ctypes.cast(self.hook, ctypes.c_void_p).value)
+        self.thread.start()
+
+    def stop(self):
+        ''' Wait for a compile in progress; the engines must outlive it '''
+        self.hot.put(None)
+        self.thread.join()
+
+    def close(self):
+        ''' Free the optimized code, once no code can call it '''
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+
+
+def jit(ast, sysarg, optimization=True, timer=None):
+    '''
+    Run the program from an unoptimized, instrumented compile and move hot
+    functions to code compiled from ast at optimization (see
+    codegen.pipeline) on a background thread
+    A running call moves over at the next back edge of a loop; one without
+    loops keeps its tier
+    timer times the foreground phases; the background compile overlaps run
+    Return the exit status of run and the names of the functions moved
+    '''
+    codegen.initialize_llvm()
+    tiers = Tiers(ast, codegen.pipeline(optimization))
+    engine = None
+    tiers.start()
+    try:
+        with timed(timer, 'generate_ir'):
+            tiered_module = codegen.generate_ir(ast, tiered=True)
+        with timed(timer, 'mcjit finalize'):
+            engine = create_engine(tiered_module, False)
+        for value in tiered_module.global_values:
+            for prefix, slots in ((codegen.TIER_SLOT, tiers.slots), (codegen.TIER_OSR, tiers.osr)):
+                if value.name.startswith(prefix):
+                    slots[value.name[len(prefix):]] = engine.get_global_value_address(value.name)
+        entry = engine.get_function_address("run")
+        cfunc = CFUNCTYPE(c_int)(entry)
+        with timed(timer, 'run'), codegen.arg_lock:
+            codegen.set_args(sysarg)
+            result = cfunc()
+    finally:
+        tiers.stop()
+        tiers.close()
+        if engine is not None:
+            engine.close()
+    return result, tiers.installed
+
+def execute(ast, sysarg, optimization=True, timer=None):
+    result, _ = jit(ast, sysarg, optimization, timer)
+    print("\nexit: {}".format(result))
@@ -1,16 +1,34 @@
 from yaml import dump
 import mmap
+import os
+import sys
+
+# source file name that reads the program from standard input
+STDIN = '-'
 
 def read_file(fileName):
-  f = open(fileName,"r")
-  mMap = mmap.mmap(f.fileno(),0, prot = mmap.PROT_READ)
-  stringFile =str(mMap[:])
-  stringFile = stringFile[2:-1]
-  data = mMap[:].decode('ascii')
-  return data
+  '''
+  Return the source text of fileName, or of stdin for '-'
+  The file is mapped and decoded straight from the map, so the only copy
+  kept in memory is the returned string
+  '''
+  if fileName == STDIN:
+    return sys.stdin.buffer.read().decode('ascii')
+  with open(fileName, 'rb') as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      # an empty file cannot be mapped
+      return ''
+    with mmap.mmap(f.fileno(), 0, prot = mmap.PROT_READ) as mMap:
+      return str(mMap, 'ascii')
+
+def base_name(fileName):
+  ''' fileName without its extension, where -emit-* outputs go; stdin for '-' '''
+  if fileName == STDIN:
+    return 'stdin'
+  return fileName.rsplit('.', 1)[0]
 
 def emit_ast(fileName, output):
-  yaml = dump(output, default_flow_style=False)
+  yaml = dump(output.to_dict(), default_flow_style=False)
   file = open(fileName, 'w')
   file.write(yaml)
   file.close()